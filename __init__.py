@@ -4,12 +4,16 @@ from pathlib import Path
 import bpy
 from mathutils import Euler
 
-from .common_utils import build_cache
+from .common_utils import build_cache, reset_file_misses, report_file_misses, get_cache_dir
 from ...common_api.collections_api import get_or_create_collection
 from .game import Game
-from bpy.props import EnumProperty
-from .msh_loader import load_msh
+from bpy.props import EnumProperty, IntProperty, BoolProperty
+from .msh_loader import load_msh, clear_mesh_cache, set_mesh_cache_budget
 from .map_loader import load_hpl2_map, load_hpl3_map
+from .ent_loader import clear_ent_cache
+from .mat_loader import clear_mat_cache, reset_texture_stats, report_texture_stats, upgrade_preview_textures
+from .profiling import begin_profile, end_profile, count
+from .texture_cache import set_texture_preview_level
 
 
 def plugin_init():
@@ -38,39 +42,109 @@ def detect_game_root(path: Path):
 
 def msh_load(operator, filepath: str, files: list[str]):
     game_root = detect_game_root(Path(filepath))
+    clear_mesh_cache()
+    clear_mat_cache()
     collection = get_or_create_collection("test", bpy.context.scene.collection)
     base_path = Path(filepath).parent
-    for file in files:
-        filepath = base_path / file
-        load_msh(game_root, filepath, collection, Game(operator.game))
+    try:
+        for file in files:
+            filepath = base_path / file
+            load_msh(game_root, filepath, collection, Game(operator.game))
+    finally:
+        clear_mesh_cache()
+        clear_mat_cache()
     return {"FINISHED"}
 
 
-def map_load(operator, filepath: str, files: list[str]):
-    game_root = detect_game_root(Path(filepath))
-    build_cache(game_root, ("*.dds", "*.msh", "*.mat", "*.tga", "*.ent"))
-    base_path = Path(filepath).parent
-    root = bpy.data.objects.new("ROOT", None)
-    root.matrix_world = Euler((math.radians(90), 0, 0), "XYZ").to_matrix().to_4x4()
-    bpy.context.scene.collection.objects.link(root)
+def _datablock_counts():
+    return {name: len(getattr(bpy.data, name)) for name in ("objects", "meshes", "materials", "images")}
+
+
+def _begin_import_profile(operator, filepath: str):
+    # Last thing before the import's try block, _end_import_profile in its finally closes the profile again
+    counts = _datablock_counts()
+    if operator.profile_import:
+        begin_profile(filepath)
+    return counts
+
 
-    for file in files:
-        filepath = base_path / file
-        load_hpl2_map(game_root, filepath, root, Game(operator.game))
+def _end_import_profile(operator, counts_before: dict[str, int]):
+    if not operator.profile_import:
+        return
+    for name, value in _datablock_counts().items():
+        count(f"bpy.{name}_created", value - counts_before[name])
+    end_profile(get_cache_dir() / "profiles")
+
+
+def _upgrade_preview_textures(operator):
+    # Opt-in: swaps every preview image in the file, including ones from earlier imports, to full resolution
+    if operator.upgrade_preview_textures:
+        upgraded = upgrade_preview_textures()
+        print(f"Upgraded {upgraded} preview textures to full resolution")
+
+
+def map_load(operator, filepath: str, files: list[str]):
+    counts_before = _begin_import_profile(operator, filepath)
+    try:
+        game_root = detect_game_root(Path(filepath))
+        reset_file_misses()
+        reset_texture_stats()
+        clear_mesh_cache()
+        clear_ent_cache()
+        clear_mat_cache()
+        set_mesh_cache_budget(operator.mesh_cache_size * 1024 * 1024)
+        build_cache(game_root, ("*.dds", "*.msh", "*.mat", "*.tga", "*.ent"))
+        base_path = Path(filepath).parent
+        root = bpy.data.objects.new("ROOT", None)
+        root.matrix_world = Euler((math.radians(90), 0, 0), "XYZ").to_matrix().to_4x4()
+        bpy.context.scene.collection.objects.link(root)
+        set_texture_preview_level(operator.texture_preview_level)
+        for file in files:
+            filepath = base_path / file
+            load_hpl2_map(game_root, filepath, root, Game(operator.game), operator.stream_xml)
+        _upgrade_preview_textures(operator)
+    finally:
+        set_texture_preview_level(0)
+        _end_import_profile(operator, counts_before)
+        # Parsed data (and the mmaps behind cached meshes) only lives for one import
+        clear_mesh_cache()
+        clear_ent_cache()
+        clear_mat_cache()
+    report_file_misses()
+    report_texture_stats()
     return {"FINISHED"}
 
 
 def hpm_load(operator, filepath: str, files: list[str]):
-    game_root = detect_game_root(Path(filepath))
-    build_cache(game_root, ("*.dds", "*.msh", "*.mat", "*.tga", "*.ent"))
-    base_path = Path(filepath).parent
-    root = bpy.data.objects.new("ROOT", None)
-    root.matrix_world = Euler((math.radians(90), 0, 0), "XYZ").to_matrix().to_4x4()
-    bpy.context.scene.collection.objects.link(root)
-
-    for file in files:
-        filepath = base_path / file
-        load_hpl3_map(game_root, filepath, root, Game(operator.game))
+    counts_before = _begin_import_profile(operator, filepath)
+    try:
+        game_root = detect_game_root(Path(filepath))
+        reset_file_misses()
+        reset_texture_stats()
+        clear_mesh_cache()
+        clear_ent_cache()
+        clear_mat_cache()
+        set_mesh_cache_budget(operator.mesh_cache_size * 1024 * 1024)
+        build_cache(game_root, ("*.dds", "*.msh", "*.mat", "*.tga", "*.ent"))
+        base_path = Path(filepath).parent
+        root = bpy.data.objects.new("ROOT", None)
+        root.matrix_world = Euler((math.radians(90), 0, 0), "XYZ").to_matrix().to_4x4()
+        bpy.context.scene.collection.objects.link(root)
+        set_texture_preview_level(operator.texture_preview_level)
+        for file in files:
+            filepath = base_path / file
+            load_hpl3_map(game_root, filepath, root, Game(operator.game), operator.stream_xml,
+                          operator.detail_point_cloud)
+        _upgrade_preview_textures(operator)
+    finally:
+        set_texture_preview_level(0)
+        _end_import_profile(operator, counts_before)
+        # Parsed data (and the mmaps behind cached meshes) only lives for one import
+        clear_mesh_cache()
+        clear_ent_cache()
+        clear_mat_cache()
+    report_file_misses()
+    report_texture_stats()
     return {"FINISHED"}
 
 
@@ -112,6 +186,49 @@ plugin_info = {
                         "items": [(item.value, item.value, "", i) for i, item in enumerate(Game)],
                         "default": Game.OTHER_HPL2.value
                     }
+                },
+                {
+                    "name": "Mesh cache size (MB)",
+                    "prop_name": "mesh_cache_size",
+                    "bl_type": IntProperty,
+                    "kwargs": {
+                        "default": 512,
+                        "min": 0,
+                    }
+                },
+                {
+                    "name": "Texture preview level",
+                    "prop_name": "texture_preview_level",
+                    "bl_type": IntProperty,
+                    "kwargs": {
+                        "default": 0,
+                        "min": 0,
+                        "max": 4,
+                    }
+                },
+                {
+                    "name": "Upgrade preview textures",
+                    "prop_name": "upgrade_preview_textures",
+                    "bl_type": BoolProperty,
+                    "kwargs": {
+                        "default": False,
+                    }
+                },
+                {
+                    "name": "Stream XML",
+                    "prop_name": "stream_xml",
+                    "bl_type": BoolProperty,
+                    "kwargs": {
+                        "default": False,
+                    }
+                },
+                {
+                    "name": "Profile import",
+                    "prop_name": "profile_import",
+                    "bl_type": BoolProperty,
+                    "kwargs": {
+                        "default": False,
+                    }
                 }
             ]
         },
@@ -130,6 +247,57 @@ plugin_info = {
                         "items": [(item.value, item.value, "", i) for i, item in enumerate(Game)],
                         "default": Game.OTHER_HPL3.value,
                     }
+                },
+                {
+                    "name": "Mesh cache size (MB)",
+                    "prop_name": "mesh_cache_size",
+                    "bl_type": IntProperty,
+                    "kwargs": {
+                        "default": 512,
+                        "min": 0,
+                    }
+                },
+                {
+                    "name": "Texture preview level",
+                    "prop_name": "texture_preview_level",
+                    "bl_type": IntProperty,
+                    "kwargs": {
+                        "default": 0,
+                        "min": 0,
+                        "max": 4,
+                    }
+                },
+                {
+                    "name": "Upgrade preview textures",
+                    "prop_name": "upgrade_preview_textures",
+                    "bl_type": BoolProperty,
+                    "kwargs": {
+                        "default": False,
+                    }
+                },
+                {
+                    "name": "Stream XML",
+                    "prop_name": "stream_xml",
+                    "bl_type": BoolProperty,
+                    "kwargs": {
+                        "default": False,
+                    }
+                },
+                {
+                    "name": "Profile import",
+                    "prop_name": "profile_import",
+                    "bl_type": BoolProperty,
+                    "kwargs": {
+                        "default": False,
+                    }
+                },
+                {
+                    "name": "Detail meshes as point clouds",
+                    "prop_name": "detail_point_cloud",
+                    "bl_type": BoolProperty,
+                    "kwargs": {
+                        "default": False,
+                    }
                 }
             ]
         }
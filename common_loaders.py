@@ -2,16 +2,37 @@ import math
 from typing import Optional
 
 import bpy
-from mathutils import Euler, Matrix, Vector
+import numpy as np
+from mathutils import Matrix, Vector
 
 from ...common_api import get_or_create_collection
 from .game import Game
 from .resource_types.hpl2.map import PointLight, SpotLight, BoxLight
 from .resource_types.hpl_common.map import EntityCommon
+from .transforms import compose_euler_matrix, object_matrices
+
+_PLACED_TYPES = (EntityCommon, SpotLight, BoxLight, PointLight)
+
+
+def _object_matrix(entity, matrix: Optional[np.ndarray]):
+    if matrix is None:
+        matrix = compose_euler_matrix(entity.position, entity.rotation, entity.scale)
+    return Matrix(matrix)
+
+
+def load_entities(entities, parent_object, entities_collection, game: Game,
+                  parent_collection: Optional[bpy.types.Collection] = None):
+    entities = list(entities)
+    placed = [entity for entity in entities if isinstance(entity, _PLACED_TYPES)]
+    for entity, matrix in zip(placed, object_matrices(placed)):
+        load_entity(entity, parent_object, entities_collection, game, parent_collection, matrix)
+    for entity in entities:
+        if not isinstance(entity, _PLACED_TYPES):
+            print(f"Unsupported entity: {type(entity)}")
 
 
 def load_entity(entity, parent_object, entities_collection, game: Game,
-                parent_collection: Optional[bpy.types.Collection] = None):
+                parent_collection: Optional[bpy.types.Collection] = None, matrix: Optional[np.ndarray] = None):
     if isinstance(entity, EntityCommon):
         entity_collection_instances = parent_collection or get_or_create_collection("EntitiesInstances",
                                                                                     bpy.context.scene.collection)
@@ -23,9 +44,7 @@ def load_entity(entity, parent_object, entities_collection, game: Game,
         entity_collection_instances.objects.link(obj)
         obj["entity_data"] = {}
         obj["entity_data"]["entity"] = entity.user_variables
-        matrix = Matrix.LocRotScale(Vector(entity.position),
-                                    Euler(entity.rotation),
-                                    Vector(entity.scale))
+        matrix = _object_matrix(entity, matrix)
         obj.hide_viewport = not entity.active
         obj.hide_render = not entity.active
         obj.matrix_local = matrix
@@ -45,9 +64,7 @@ def load_entity(entity, parent_object, entities_collection, game: Game,
         lights_collection.objects.link(obj)
         obj["entity_data"] = {}
         obj["entity_data"]["entity"] = entity.as_dict()
-        matrix = Matrix.LocRotScale(Vector(entity.position),
-                                    Euler(entity.rotation),
-                                    Vector(entity.scale))
+        matrix = _object_matrix(entity, matrix)
         obj.hide_viewport = not entity.active
         obj.hide_render = not entity.active
         obj.matrix_local = matrix
@@ -66,9 +83,7 @@ def load_entity(entity, parent_object, entities_collection, game: Game,
         lights_collection.objects.link(obj)
         obj["entity_data"] = {}
         obj["entity_data"]["entity"] = entity.as_dict()
-        matrix = Matrix.LocRotScale(Vector(entity.position),
-                                    Euler(entity.rotation),
-                                    Vector(entity.scale))
+        matrix = _object_matrix(entity, matrix)
         obj.hide_viewport = not entity.active
         obj.hide_render = not entity.active
         obj.matrix_local = matrix
@@ -87,9 +102,7 @@ def load_entity(entity, parent_object, entities_collection, game: Game,
         lights_collection.objects.link(obj)
         obj["entity_data"] = {}
         obj["entity_data"]["entity"] = entity.as_dict()
-        matrix = Matrix.LocRotScale(Vector(entity.position),
-                                    Euler(entity.rotation),
-                                    Vector(entity.scale))
+        matrix = _object_matrix(entity, matrix)
         obj.hide_viewport = not entity.active
         obj.hide_render = not entity.active
         obj.matrix_local = matrix
@@ -1,5 +1,16 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Optional, Union
+
+from .profiling import count, profiled
 
 
 def pop_path_back(path: Path):
@@ -10,21 +21,284 @@ def pop_path_back(path: Path):
 
 
 _FILE_CACHE = {}
+_INDEX_VERSION = 1
+
+
+class _SuffixNode:
+    __slots__ = ("file", "rest", "children")
+
+    def __init__(self, file: Optional[Path] = None, rest: tuple[str, ...] = ()):
+        self.file = file
+        self.rest = rest
+        self.children: Optional[dict[str, "_SuffixNode"]] = None
+
+
+# Reversed-path trie answering "longest matching tail" queries over indexed files.
+# Chains leading to a single file stay collapsed in `rest` until another file shares the tail.
+class SuffixIndex:
+
+    def __init__(self):
+        self._root = _SuffixNode()
+        self._root.children = {}
+        self.extensions: set[str] = set()
+
+    @staticmethod
+    def _components(path: Union[str, Path]):
+        return tuple(reversed(Path(str(path).lower()).parts))
+
+    def insert(self, rel_path: str, file: Path):
+        self.extensions.add(os.path.splitext(rel_path)[1].lower())
+        components = self._components(rel_path)
+        node = self._root
+        for i, component in enumerate(components):
+            if node.children is None:
+                node.children = {}
+                if node.rest:
+                    node.children[node.rest[0]] = _SuffixNode(node.file, node.rest[1:])
+                node.rest = ()
+            child = node.children.get(component)
+            if child is None:
+                node.children[component] = _SuffixNode(file, components[i + 1:])
+                return
+            node = child
+
+    def find(self, file_path: Union[str, Path]) -> Optional[Path]:
+        node = self._root
+        for i, component in enumerate(self._components(file_path)):
+            if node.children is None:
+                return node.file
+            child = node.children.get(component)
+            if child is None:
+                return node.file if i > 0 else None
+            node = child
+        return node.file
+
+
+_SUFFIX_INDEX: Optional[SuffixIndex] = None
+_SUFFIX_LOOKUPS: dict[str, Optional[Path]] = {}
+
+_NEGATIVE_CACHE_SIZE = 4096
+_NEGATIVE_CACHE: OrderedDict[tuple[str, str], None] = OrderedDict()
+# Guards the negative cache, suffix lookups and miss report, find_file_v2 is called from prefetch threads
+_RESOLVE_LOCK = threading.Lock()
+
+
+@dataclass(slots=True)
+class MissRecord:
+    references: int = 0
+    resolve_time: float = 0.0
+
+
+_MISS_REPORT: dict[str, MissRecord] = {}
+
+
+def reset_file_misses():
+    with _RESOLVE_LOCK:
+        _MISS_REPORT.clear()
+
+
+def report_file_misses():
+    if not _MISS_REPORT:
+        return
+    total_time = sum(record.resolve_time for record in _MISS_REPORT.values())
+    print(f"Failed to resolve {len(_MISS_REPORT)} files ({total_time:.3f}s spent resolving):")
+    for path, record in sorted(_MISS_REPORT.items(), key=lambda item: (-item[1].references, item[0])):
+        print(f"\t{path}: {record.references} references, {record.resolve_time * 1000:.2f}ms")
+
+
+def _record_miss(file_path: Path, elapsed: float):
+    # Caller holds _RESOLVE_LOCK
+    record = _MISS_REPORT.get(str(file_path))
+    if record is None:
+        record = _MISS_REPORT[str(file_path)] = MissRecord()
+    record.references += 1
+    record.resolve_time += elapsed
+
+
+def get_cache_dir() -> Path:
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    cache_dir = base / "AmnesiaLoader"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def _index_path(game_root: Path):
+    key = hashlib.sha1(str(game_root.absolute()).lower().encode("utf8")).hexdigest()[:16]
+    return get_cache_dir() / f"index_{key}.json"
+
+
+def _load_index(index_path: Path, game_root: Path, file_masks: tuple[str, ...]):
+    if not index_path.exists():
+        return {}
+    try:
+        with index_path.open("r", encoding="utf8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if (not isinstance(index, dict) or
+            index.get("version") != _INDEX_VERSION or
+            index.get("root") != str(game_root.absolute()) or
+            index.get("masks") != list(file_masks)):
+        return {}
+    dirs = index.get("dirs")
+    # Valid JSON in the wrong shape (hand edits, other tools, partial writes) forces a full rescan
+    if not isinstance(dirs, dict) or not all(_valid_dir_entry(entry) for entry in dirs.values()):
+        return {}
+    return dirs
+
+
+def _valid_dir_entry(entry):
+    return (isinstance(entry, dict) and
+            isinstance(entry.get("mtime"), int) and
+            isinstance(entry.get("files"), list) and all(isinstance(name, str) for name in entry["files"]) and
+            isinstance(entry.get("dirs"), list) and all(isinstance(name, str) for name in entry["dirs"]))
+
+
+def _save_index(index_path: Path, game_root: Path, file_masks: tuple[str, ...], dirs: dict):
+    tmp_path = index_path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf8") as f:
+        json.dump({"version": _INDEX_VERSION, "root": str(game_root.absolute()),
+                   "masks": list(file_masks), "dirs": dirs}, f)
+    os.replace(tmp_path, index_path)
+
+
+@dataclass(slots=True)
+class WalkStats:
+    dirs: dict = field(default_factory=dict)
+    extension_counts: Counter = field(default_factory=Counter)
+    rescanned: int = 0
+    elapsed: float = 0.0
 
 
-def build_cache(game_root: Path, file_masks: Iterable[str]):
+def _scan_directory(path: Path, extensions: frozenset[str]):
+    files = []
+    sub_dirs = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.name)
+            elif os.path.splitext(entry.name)[1].lower() in extensions:
+                files.append(entry.name)
+    return files, sub_dirs
+
+
+def _visit_directory(game_root: Path, rel_dir: str, extensions: frozenset[str], cached_dirs: dict):
+    path = game_root / rel_dir
+    try:
+        mtime = path.stat().st_mtime_ns
+        cached = cached_dirs.get(rel_dir)
+        if cached is not None and cached["mtime"] == mtime:
+            return rel_dir, cached, False
+        files, sub_dirs = _scan_directory(path, extensions)
+    except OSError:
+        return rel_dir, None, False
+    return rel_dir, {"mtime": mtime, "files": files, "dirs": sub_dirs}, True
+
+
+def walk_asset_tree(game_root: Path, extensions: Iterable[str], cached_dirs: dict = None, workers: int = 1):
+    extensions = frozenset(ext.lower() for ext in extensions)
+    cached_dirs = cached_dirs or {}
+    stats = WalkStats()
+    start = time.perf_counter()
+
+    def _collect(rel_dir, entry, rescanned):
+        if entry is None:
+            return []
+        stats.dirs[rel_dir] = entry
+        stats.rescanned += rescanned
+        for name in entry["files"]:
+            stats.extension_counts[os.path.splitext(name)[1].lower()] += 1
+        return [os.path.join(rel_dir, sub_dir) for sub_dir in entry["dirs"]]
+
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            pending = {pool.submit(_visit_directory, game_root, "", extensions, cached_dirs)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for sub_dir in _collect(*future.result()):
+                        pending.add(pool.submit(_visit_directory, game_root, sub_dir, extensions, cached_dirs))
+    else:
+        queue = [""]
+        while queue:
+            queue.extend(_collect(*_visit_directory(game_root, queue.pop(), extensions, cached_dirs)))
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+@profiled("files.index")
+def build_cache(game_root: Path, file_masks: Iterable[str], workers: int = 4):
     print("Building cache")
-    for mask in file_masks:
-        for file in game_root.rglob(mask):
-            _FILE_CACHE[file.name.lower()] = file
-            _FILE_CACHE[str(file.relative_to(game_root)).lower()] = file
-    print(f"Indexed {len(_FILE_CACHE) // 2} files")
+    file_masks = tuple(mask.lower() for mask in file_masks)
+    index_path = _index_path(game_root)
+    old_dirs = _load_index(index_path, game_root, file_masks)
+    stats = walk_asset_tree(game_root, (mask.lstrip("*") for mask in file_masks), old_dirs, workers)
+    if stats.rescanned or stats.dirs.keys() != old_dirs.keys():
+        try:
+            _save_index(index_path, game_root, file_masks, stats.dirs)
+        except OSError as ex:
+            print(f"Failed to save file index to {index_path}: {ex}")
+
+    global _SUFFIX_INDEX
+    _SUFFIX_INDEX = SuffixIndex()
+    _SUFFIX_LOOKUPS.clear()
+    _NEGATIVE_CACHE.clear()
+    for rel_dir, entry in sorted(stats.dirs.items()):
+        for name in entry["files"]:
+            rel_path = os.path.join(rel_dir, name)
+            file = game_root / rel_path
+            _FILE_CACHE[name.lower()] = file
+            _FILE_CACHE[str(Path(rel_path)).lower()] = file
+            _SUFFIX_INDEX.insert(rel_path, file)
+    counts = ", ".join(f"{ext}: {count}" for ext, count in sorted(stats.extension_counts.items()))
+    print(f"Indexed {len(_FILE_CACHE) // 2} files ({counts}) in {stats.elapsed:.3f}s, "
+          f"rescanned {stats.rescanned} of {len(stats.dirs)} directories")
+    return stats
+
+
+@profiled("files.resolve")
+def find_file_v2(game_root: Path, file_path: Path, record_miss: bool = True):
+    # record_miss=False keeps lookups made ahead of the build (prefetch) out of the per-import miss report
+    start = time.perf_counter()
+    miss_key = (str(game_root), str(file_path).lower())
+    with _RESOLVE_LOCK:
+        if miss_key in _NEGATIVE_CACHE:
+            _NEGATIVE_CACHE.move_to_end(miss_key)
+            if record_miss:
+                _record_miss(file_path, time.perf_counter() - start)
+            count("files.negative_cache_hits")
+            return None
+    resolved = _find_file(game_root, file_path)
+    count("files.resolved" if resolved is not None else "files.missed")
+    if resolved is None:
+        with _RESOLVE_LOCK:
+            _NEGATIVE_CACHE[miss_key] = None
+            if len(_NEGATIVE_CACHE) > _NEGATIVE_CACHE_SIZE:
+                _NEGATIVE_CACHE.popitem(last=False)
+            if record_miss:
+                _record_miss(file_path, time.perf_counter() - start)
+    return resolved
 
 
-def find_file_v2(game_root: Path, file_path: Path):
+def _find_file(game_root: Path, file_path: Path):
     # Fast path
     if (game_root / file_path).exists():
         return game_root / file_path
+    # Indexed path
+    if _SUFFIX_INDEX is not None and file_path.suffix.lower() in _SUFFIX_INDEX.extensions:
+        key = str(file_path).lower()
+        with _RESOLVE_LOCK:
+            if key in _SUFFIX_LOOKUPS:
+                return _SUFFIX_LOOKUPS[key]
+        resolved = _SUFFIX_INDEX.find(file_path)
+        with _RESOLVE_LOCK:
+            _SUFFIX_LOOKUPS[key] = resolved
+        return resolved
     # Slow path
     second_part = Path(str(file_path).lower())
     for _ in range(len(file_path.parts)):
@@ -1,15 +1,18 @@
 from pathlib import Path
-import xml.etree.ElementTree as ET
+from typing import Union
 
 import bpy
-from mathutils import Matrix, Vector, Euler
+from mathutils import Matrix
 
 from .msh_loader import load_msh
-from .common_loaders import load_entity
+from .common_loaders import load_entities
 from ...common_api import get_or_create_collection
 from .game import Game
+from .profiling import count, profiled, timed
 from .resource_types.hpl2.ent import EntityFile as EntityFileHPL2
 from .resource_types.hpl3.ent import EntityFile as EntityFileHPL3
+from .resource_types.xml_backend import parse_xml, XmlParseError
+from .transforms import object_matrices
 
 
 def _get_all_objects(obj: bpy.types.Object):
@@ -19,30 +22,51 @@ def _get_all_objects(obj: bpy.types.Object):
     return objects
 
 
+_ENT_CACHE: dict[tuple[str, str], Union[EntityFileHPL2, EntityFileHPL3]] = {}
+
+
+def clear_ent_cache():
+    _ENT_CACHE.clear()
+
+
+def read_ent(ent_path: Path, game: Game):
+    key = (str(ent_path.absolute()).lower(), game.value)
+    cached = _ENT_CACHE.get(key)
+    if cached is not None:
+        count("ent.cache_hits")
+        return cached
+    count("ent.cache_misses")
+    with timed("ent.parse", path=str(ent_path)):
+        try:
+            root = parse_xml(ent_path)
+        except XmlParseError as ex:
+            raise RuntimeError(f"Failed to parse {ent_path} due to: {ex}") from ex
+        if game.value in [Game.DARK_DESCENT.value, Game.MACHINE_FOR_PIGS.value, Game.OTHER_HPL2.value]:
+            entity_data = EntityFileHPL2.from_xml(root)
+        elif game.value in [Game.SOMA.value, Game.BUNKER.value, Game.OTHER_HPL3.value]:
+            entity_data = EntityFileHPL3.from_xml(root)
+        else:
+            raise NotImplementedError(f"Entity objects from {game} are not supported")
+    _ENT_CACHE[key] = entity_data
+    return entity_data
+
+
+@profiled("ent.build")
 def load_ent(game_root: Path, ent_path: Path, parent_collection: bpy.types.Collection, game: Game):
     # print(f"Loading {ent_path}")
-    try:
-        root = ET.parse(ent_path).getroot()
-    except ET.ParseError as ex:
-        raise RuntimeError(f"Failed to parse {ent_path} due to: {ex}") from ex
-    if game.value in [Game.DARK_DESCENT.value, Game.MACHINE_FOR_PIGS.value, Game.OTHER_HPL2.value]:
-        entity_data = EntityFileHPL2.from_xml(root)
-    elif game.value in [Game.SOMA.value, Game.BUNKER.value, Game.OTHER_HPL3.value]:
-        entity_data = EntityFileHPL3.from_xml(root)
-    else:
-        raise NotImplementedError(f"Entity objects from {game} are not supported")
+    entity_data = read_ent(ent_path, game)
     file_collection = get_or_create_collection(ent_path.stem, parent_collection)
     mesh_obj, submeshes = load_msh(game_root, entity_data.model_data.mesh.filename.with_suffix(".msh"),
                                    file_collection, game)
+    submesh_matrices = object_matrices(entity_data.model_data.mesh.submeshes)
     for i, submesh in enumerate(entity_data.model_data.mesh.submeshes):
         if submesh.sub_mesh_id is None:
             submesh.sub_mesh_id = i
         if submesh.sub_mesh_id >= len(submeshes):
             continue
         submesh_obj = bpy.data.objects[submeshes[submesh.sub_mesh_id]]
-        extra_matrix = Matrix.LocRotScale(Vector(submesh.position), Euler(submesh.rotation), Vector(submesh.scale))
+        extra_matrix = Matrix(submesh_matrices[i])
         submesh_obj.matrix_local = submesh_obj.matrix_local @ extra_matrix
         submesh_obj["extra_matrix"] = extra_matrix
-    for entity in entity_data.model_data.entities:
-        load_entity(entity, mesh_obj, {}, game, file_collection)
+    load_entities(entity_data.model_data.entities, mesh_obj, {}, game, file_collection)
     return file_collection.name
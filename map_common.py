@@ -1,18 +1,22 @@
+import datetime
 from pathlib import Path
+from typing import Iterable, Optional
 
 import bpy
 import numpy as np
-from mathutils import Vector, Matrix, Euler
+from mathutils import Vector, Matrix
 
 from UniLoader.bpy_helper import is_blender_4_1
 from .msh_loader import load_msh
 from ...common_api import create_material, get_or_create_collection, exclude_collection
 from .mat_loader import generate_material_nodes
 from .game import Game
-from .resource_types.hpl_common.map import PlaneCommon, DecalCommon, File, StaticObjectCommon
+from .prefetch import prefetch_assets
+from .resource_types.hpl_common.map import PlaneCommon, DecalCommon, File, StaticObjectColumns
+from .transforms import compose_euler_matrices, object_matrices
 
 
-def generate_plane(game_root: Path, plane: PlaneCommon, game: Game):
+def generate_plane(game_root: Path, plane: PlaneCommon, game: Game, matrix: Optional[np.ndarray] = None):
     start_corner = Vector(plane.start_corner)
     end_corner = Vector(plane.end_corner)
 
@@ -28,9 +32,9 @@ def generate_plane(game_root: Path, plane: PlaneCommon, game: Game):
     mesh.from_pydata(corners, [], [[2, 3, 1, 0]])
     generate_material_nodes(game_root, plane.material, create_material(plane.material.stem, obj), obj, game)
 
-    obj.matrix_local = Matrix.LocRotScale(Vector(plane.position),
-                                          Euler(plane.rotation),
-                                          Vector(plane.scale))
+    if matrix is None:
+        matrix = object_matrices([plane])[0]
+    obj.matrix_local = Matrix(matrix)
     uv_data = np.asarray([
         uv_data[0], uv_data[3],
         uv_data[1], uv_data[2]
@@ -47,6 +51,18 @@ def generate_plane(game_root: Path, plane: PlaneCommon, game: Game):
     return obj
 
 
+def generate_planes(game_root: Path, planes: Iterable[PlaneCommon], game: Game, collection: bpy.types.Collection,
+                    parent_object):
+    planes = list(planes)
+    objects = []
+    for plane, matrix in zip(planes, object_matrices(planes)):
+        obj = generate_plane(game_root, plane, game, matrix)
+        collection.objects.link(obj)
+        obj.parent = parent_object
+        objects.append(obj)
+    return objects
+
+
 def load_decal(collection, decal: DecalCommon, decal_material_list: list[File], game, game_root, parent_object):
     model_name = decal.name
     mesh_data = bpy.data.meshes.new(model_name + f"_MESH")
@@ -78,11 +94,12 @@ def load_decal(collection, decal: DecalCommon, decal_material_list: list[File],
     return mesh_obj
 
 
-def load_static_objects(file_list: list[File], game: Game, game_root: Path, parent_object,
-                        static_objects: list[StaticObjectCommon]):
+def load_static_object_files(file_list: list[File], game: Game, game_root: Path, prefetch: bool = True):
+    # prefetch=False when the map-level prefetch already parsed these meshes
     collections = {}
+    if prefetch:
+        prefetch_assets(game_root, game, meshes=[game_root / file.path.with_suffix(".msh") for file in file_list])
     collection_master = get_or_create_collection("StaticObjectsSource", bpy.context.scene.collection)
-    collection_instances = get_or_create_collection("StaticObjectsInstances", bpy.context.scene.collection)
     for file in file_list:
         file_collection = get_or_create_collection(f"{file.id}_" + file.path.stem, collection_master)
         collections[file.id] = file_collection.name
@@ -95,22 +112,115 @@ def load_static_objects(file_list: list[File], game: Game, game_root: Path, pare
             continue
         load_msh(game_root, mesh_path, file_collection, game)
     exclude_collection(collection_master)
+    return collections
+
+
+def create_static_objects(columns: StaticObjectColumns, collections: dict[int, str], parent_object,
+                          collection_instances: bpy.types.Collection):
+    matrices = compose_euler_matrices(columns.position, columns.rotation, columns.scale)
     objects = []
-    for entity in static_objects:
-        obj = bpy.data.objects.new(entity.name, None)
+    for i, name in enumerate(columns.names):
+        obj = bpy.data.objects.new(name, None)
         obj.empty_display_size = 1
         obj.instance_type = 'COLLECTION'
-        obj.instance_collection = bpy.data.collections[collections[entity.file_index]]
-        scale = entity.scale
-        scale[0] = max(0.01, scale[0])
-        scale[1] = max(0.01, scale[1])
-        scale[2] = max(0.01, scale[2])
-        obj.matrix_local = Matrix.LocRotScale(Vector(entity.position),
-                                              Euler(entity.rotation),
-                                              Vector(scale))
+        obj.instance_collection = bpy.data.collections[collections[int(columns.file_index[i])]]
+        obj.matrix_local = Matrix(matrices[i])
         obj.parent = parent_object
         collection_instances.objects.link(obj)
         obj["entity_data"] = {}
-        obj["entity_data"]["entity"] = entity.as_dict()
+        obj["entity_data"]["entity"] = columns.row_dict(i)
         objects.append(obj)
     return objects
+
+
+def load_static_objects(file_list: list[File], game: Game, game_root: Path, parent_object,
+                        columns: StaticObjectColumns, prefetch: bool = True):
+    collections = load_static_object_files(file_list, game, game_root, prefetch)
+    collection_instances = get_or_create_collection("StaticObjectsInstances", bpy.context.scene.collection)
+    return create_static_objects(columns, collections, parent_object, collection_instances)
+
+
+def _new_group_socket(group: bpy.types.NodeTree, name: str, in_out: str, socket_type: str):
+    # Blender 4.0 moved group sockets to NodeTree.interface
+    if hasattr(group, "interface"):
+        return group.interface.new_socket(name, in_out=in_out, socket_type=socket_type)
+    sockets = group.inputs if in_out == "INPUT" else group.outputs
+    return sockets.new(socket_type, name)
+
+
+def _named_attribute_node(group: bpy.types.NodeTree, name: str, data_type: str):
+    node = group.nodes.new("GeometryNodeInputNamedAttribute")
+    node.data_type = data_type
+    node.inputs["Name"].default_value = name
+    return node
+
+
+def get_point_instancer_group():
+    if "HPLPointInstancer" in bpy.data.node_groups:
+        return bpy.data.node_groups["HPLPointInstancer"]
+    group = bpy.data.node_groups.new("HPLPointInstancer", "GeometryNodeTree")
+    _new_group_socket(group, "Geometry", "INPUT", "NodeSocketGeometry")
+    _new_group_socket(group, "Collection", "INPUT", "NodeSocketCollection")
+    _new_group_socket(group, "Geometry", "OUTPUT", "NodeSocketGeometry")
+
+    group_input = group.nodes.new("NodeGroupInput")
+    group_output = group.nodes.new("NodeGroupOutput")
+    collection_info = group.nodes.new("GeometryNodeCollectionInfo")
+    collection_info.transform_space = "ORIGINAL"
+    instance_on_points = group.nodes.new("GeometryNodeInstanceOnPoints")
+    rotation = _named_attribute_node(group, "rotation", "FLOAT_VECTOR")
+    radius = _named_attribute_node(group, "radius", "FLOAT")
+
+    group.links.new(group_input.outputs[1], collection_info.inputs["Collection"])
+    group.links.new(group_input.outputs[0], instance_on_points.inputs["Points"])
+    group.links.new(collection_info.outputs[0], instance_on_points.inputs["Instance"])
+    group.links.new(rotation.outputs["Attribute"], instance_on_points.inputs["Rotation"])
+    group.links.new(radius.outputs["Attribute"], instance_on_points.inputs["Scale"])
+    group.links.new(instance_on_points.outputs["Instances"], group_output.inputs[0])
+
+    group_input.location = (-600, 0)
+    collection_info.location = (-300, -200)
+    rotation.location = (-300, -400)
+    radius.location = (-300, -550)
+    group_output.location = (300, 0)
+    return group
+
+
+def _group_input_identifier(group: bpy.types.NodeTree, name: str):
+    if hasattr(group, "interface"):
+        sockets = [item for item in group.interface.items_tree
+                   if item.item_type == "SOCKET" and item.in_out == "INPUT"]
+    else:
+        sockets = group.inputs
+    return next(socket.identifier for socket in sockets if socket.name == name)
+
+
+def create_point_instancer(name: str, positions: np.ndarray, rotations: np.ndarray, radii: np.ndarray,
+                           source_collection: bpy.types.Collection, ids: Optional[Iterable[int]] = None,
+                           mod_stamps: Optional[Iterable[datetime.datetime]] = None):
+    # One vertex per instance; a geometry nodes modifier instances source_collection onto every point.
+    # ids and mod_stamps are kept per point as "entity_id" and "modified" (unix time) for round-tripping.
+    positions = np.asarray(positions, np.float32).reshape((-1, 3))
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(positions))
+    mesh.vertices.foreach_set("co", positions.ravel())
+    mesh.attributes.new("rotation", "FLOAT_VECTOR", "POINT").data.foreach_set(
+        "vector", np.asarray(rotations, np.float32).ravel())
+    mesh.attributes.new("radius", "FLOAT", "POINT").data.foreach_set(
+        "value", np.asarray(radii, np.float32).ravel())
+    if ids is not None:
+        ids = np.asarray(ids, np.int32)
+        if len(ids) == len(positions):
+            mesh.attributes.new("entity_id", "INT", "POINT").data.foreach_set("value", ids)
+    if mod_stamps is not None:
+        stamps = np.asarray([int(stamp.timestamp()) for stamp in mod_stamps], np.int32)
+        if len(stamps) == len(positions):
+            mesh.attributes.new("modified", "INT", "POINT").data.foreach_set("value", stamps)
+    mesh.update()
+
+    obj = bpy.data.objects.new(name, mesh)
+    group = get_point_instancer_group()
+    modifier = obj.modifiers.new("Instances", "NODES")
+    modifier.node_group = group
+    modifier[_group_input_identifier(group, "Collection")] = source_collection
+    return obj
@@ -1,46 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, groupby
 from pathlib import Path
-import xml.etree.ElementTree as ET
+from typing import Any, Iterable, Optional
 
-from mathutils import Vector, Quaternion, Matrix
+from mathutils import Matrix
 
 from .msh_loader import load_msh
-from .common_loaders import load_entity
+from .common_loaders import load_entities
 from ...common_api import get_or_create_collection, exclude_collection
 from .ent_loader import load_ent
-from .map_common import generate_plane, load_decal, load_static_objects
+from .map_common import generate_planes, load_decal, create_point_instancer, load_static_objects, \
+    load_static_object_files, create_static_objects
 from .game import Game
-from .resource_types.hpl2.map import HPL2Map
+from .mat_loader import prepare_map_textures
+from .prefetch import prefetch_assets
+from .profiling import count, timed
+from .resource_types.hpl2.map import HPL2Map, parse_map_record, MAP_RECORD_CONTAINERS
+from .resource_types.hpl2.map import StaticObject as HPL2StaticObject
 from .resource_types.hpl3.map import HPLMapTrackDecal, HPLMapTrackPrimitive, HPLMapTrackEntity, HPLMapTrackStaticObject, \
-    HPLMapTrackDetailMeshes
+    HPLMapTrackDetailMeshes, HPLMapTrackArea, HPLMapTrackCompound, DetailMeshSection, Decal, Primitive, Entity, \
+    StaticObject, Area, Compound
+from .resource_types.hpl_common.map import File, StaticObjectColumns
+from .resource_types.hpl_common.stream import iter_map_records
+from .resource_types.xml_backend import parse_xml
+from .transforms import compose_quaternion_matrices, quaternion_to_matrices, matrices_to_euler, object_matrices
 
 import bpy
 
 
-def load_hpl2_map(game_root: Path, map_path: Path, parent_object: bpy.types.Object, game: Game):
-    root = ET.parse(map_path).getroot()
-    level_data = HPL2Map.from_xml(root)
-    level = level_data.level
-    map_data = level.map_data
-    content = map_data.map_contents
-    file_list = content.file_index_static_objects.files
-
-    load_static_objects(file_list, game, game_root, parent_object, content.static_objects.objects)
-
-    collection = get_or_create_collection("Primitives", bpy.context.scene.collection)
-    for plane in content.primitives.planes:
-        obj = generate_plane(game_root, plane, game)
-        collection.objects.link(obj)
-        obj.parent = parent_object
-
-    collection = get_or_create_collection("Decals", bpy.context.scene.collection)
-    decal_material_list = content.file_index_decals.files
-    for decal in content.decals.decals:
-        if decal.mesh.positions is None:
-            continue
-        load_decal(collection, decal, decal_material_list, game, game_root, parent_object)
-
+def _load_entity_files(game_root: Path, file_list: list[File], game: Game, prefetch: bool = True):
+    # prefetch=False when the map-level prefetch already parsed these entities
     collections = {}
-    file_list = content.file_index_entities.files
+    if prefetch:
+        prefetch_assets(game_root, game, entities=[game_root / file.path for file in file_list])
     entity_collection_master = get_or_create_collection("EntitiesSource", bpy.context.scene.collection)
 
     for file in file_list:
@@ -54,109 +47,330 @@ def load_hpl2_map(game_root: Path, map_path: Path, parent_object: bpy.types.Obje
             continue
         collections[file.id] = load_ent(game_root, ent_path, entity_collection_master, game)
     exclude_collection(entity_collection_master)
+    return collections
+
+
+TrackRecord = tuple[str, list[File], Any]
+
+
+def _iter_hpl3_track(track_path: Path, track_type, record_type, streaming: bool):
+    # Yields (section name, section files, record); files is the same list object for every record of a section
+    if streaming:
+        for section, _, record in iter_map_records(track_path, record_type.from_xml, {"Objects"}):
+            yield section.name, section.files, record
+    else:
+        track = track_type.from_xml(parse_xml(track_path))
+        for section in track.sections:
+            files = getattr(section, "files", [])
+            for record in section.objects:
+                yield section.name, files, record
+
+
+def _parse_hpl2_record(element):
+    # Static object elements are handed over as-is and read straight into StaticObjectColumns
+    if element.tag == "StaticObject":
+        return element
+    return parse_map_record(element)
+
+
+def _iter_hpl3_static_objects(track_path: Path, streaming: bool):
+    # Yields (section name, section files, StaticObjectColumns) per section
+    if streaming:
+        records = iter_map_records(track_path, lambda element: element, {"Objects"})
+        for _, group in groupby(records, key=lambda item: item[0]):
+            section, _, first = next(group)
+            yield section.name, section.files, StaticObjectColumns.from_elements(
+                StaticObject, chain((first,), (element for _, _, element in group)))
+    else:
+        track = HPLMapTrackStaticObject.from_xml(parse_xml(track_path))
+        for section in track.sections:
+            yield section.name, section.files, section.objects
+
+
+def _load_hpl2_map_streaming(game_root: Path, map_path: Path, parent_object: bpy.types.Object, game: Game):
+    static_collections = None
+    entity_collections = None
+    static_instances = get_or_create_collection("StaticObjectsInstances", bpy.context.scene.collection)
+    primitives_collection = get_or_create_collection("Primitives", bpy.context.scene.collection)
+    decals_collection = get_or_create_collection("Decals", bpy.context.scene.collection)
+    records = iter_map_records(map_path, _parse_hpl2_record, MAP_RECORD_CONTAINERS)
+    for container, group in groupby(records, key=lambda item: item[1]):
+        if container == "StaticObjects":
+            # Static objects are gathered into columns so placements can be composed in one pass
+            section, _, first = next(group)
+            columns = StaticObjectColumns.from_elements(HPL2StaticObject,
+                                                        chain((first,), (record for _, _, record in group)))
+            if static_collections is None:
+                static_collections = load_static_object_files(section.file_indices.get("FileIndex_StaticObjects", []),
+                                                              game, game_root)
+            create_static_objects(columns, static_collections, parent_object, static_instances)
+        elif container == "Primitives":
+            generate_planes(game_root, (record for _, _, record in group), game, primitives_collection,
+                            parent_object)
+        elif container == "Decals":
+            for section, _, record in group:
+                if not record.is_buildable():
+                    continue
+                load_decal(decals_collection, record, section.file_indices.get("FileIndex_Decals", []), game,
+                           game_root, parent_object)
+        elif container == "Entities":
+            section, _, first = next(group)
+            if entity_collections is None:
+                entity_collections = _load_entity_files(game_root,
+                                                        section.file_indices.get("FileIndex_Entities", []), game)
+            load_entities(chain((first,), (record for _, _, record in group)), parent_object, entity_collections,
+                          game)
+
+
+def load_hpl2_map(game_root: Path, map_path: Path, parent_object: bpy.types.Object, game: Game,
+                  streaming: bool = False):
+    if streaming:
+        with timed("map.build", path=str(map_path)):
+            _load_hpl2_map_streaming(game_root, map_path, parent_object, game)
+        return
+    with timed("map.parse", path=str(map_path)):
+        level_data = HPL2Map.from_xml(parse_xml(map_path))
+    level = level_data.level
+    map_data = level.map_data
+    content = map_data.map_contents
+    file_list = content.file_index_static_objects.files
+
+    materials = prefetch_assets(game_root, game,
+                                meshes=[game_root / file.path.with_suffix(".msh") for file in file_list],
+                                entities=[game_root / file.path for file in content.file_index_entities.files],
+                                materials=([file.path for file in content.file_index_decals.files] +
+                                           [plane.material for plane in content.primitives.planes if plane.material]))
+    prepare_map_textures(game_root, materials)
+
+    with timed("map.build", path=str(map_path)):
+        load_static_objects(file_list, game, game_root, parent_object, content.static_objects, prefetch=False)
+
+        collection = get_or_create_collection("Primitives", bpy.context.scene.collection)
+        generate_planes(game_root, content.primitives.planes, game, collection, parent_object)
 
-    for entity in content.entities:
-        load_entity(entity, parent_object, collections, game)
+        collection = get_or_create_collection("Decals", bpy.context.scene.collection)
+        decal_material_list = content.file_index_decals.files
+        for decal in content.decals.decals:
+            if not decal.is_buildable():
+                continue
+            load_decal(collection, decal, decal_material_list, game, game_root, parent_object)
+
+        collections = _load_entity_files(game_root, content.file_index_entities.files, game, prefetch=False)
+        load_entities(content.entities, parent_object, collections, game)
 
 
-def load_hpl3_primitive(game_root: Path, primitive_path: Path, parent_object: bpy.types.Object, game: Game):
-    root = ET.parse(primitive_path).getroot()
-    hpl_decal = HPLMapTrackPrimitive.from_xml(root)
+def load_hpl3_primitive(game_root: Path, primitive_path: Path, parent_object: bpy.types.Object, game: Game,
+                        streaming: bool = False, records: Optional[Iterable[TrackRecord]] = None):
     collection = get_or_create_collection("Primitives", bpy.context.scene.collection)
-    for section in hpl_decal.sections:
-        for plane in section.objects:
-            obj = generate_plane(game_root, plane, game)
-            collection.objects.link(obj)
-            obj.parent = parent_object
+    if records is None:
+        records = _iter_hpl3_track(primitive_path, HPLMapTrackPrimitive, Primitive, streaming)
+    for _, group in groupby(records, key=lambda item: item[0]):
+        generate_planes(game_root, (plane for _, _, plane in group), game, collection, parent_object)
 
 
-def load_hpl3_decals(game_root: Path, decal_path: Path, parent_object: bpy.types.Object, game: Game):
+def load_hpl3_decals(game_root: Path, decal_path: Path, parent_object: bpy.types.Object, game: Game,
+                     streaming: bool = False, records: Optional[Iterable[TrackRecord]] = None):
     print("Loading decals from", decal_path)
-    root = ET.parse(decal_path).getroot()
-    hpl_decal = HPLMapTrackDecal.from_xml(root)
     collection = get_or_create_collection("Decals", bpy.context.scene.collection)
+    if records is None:
+        records = _iter_hpl3_track(decal_path, HPLMapTrackDecal, Decal, streaming)
 
-    for section in hpl_decal.sections:
-        for decal in section.objects:
-            if decal.mesh.positions is None:
-                continue
-            decal_obj = load_decal(collection, decal, section.files, game, game_root, parent_object)
-            decal_obj["entity_data"]["entity"]["edited_by"] = section.name
-            decal_obj["entity_data"]["entity"]["modified"] = str(decal.modification)
+    for section_name, files, decal in records:
+        if not decal.is_buildable():
+            continue
+        decal_obj = load_decal(collection, decal, files, game, game_root, parent_object)
+        decal_obj["entity_data"]["entity"]["edited_by"] = section_name
+        decal_obj["entity_data"]["entity"]["modified"] = str(decal.modification)
 
 
-def load_hpl3_entities(game_root: Path, entity_path: Path, parent_object: bpy.types.Object, game: Game):
+def load_hpl3_entities(game_root: Path, entity_path: Path, parent_object: bpy.types.Object, game: Game,
+                       streaming: bool = False, records: Optional[Iterable[TrackRecord]] = None,
+                       prefetch: bool = True):
     print("Loading entities from", entity_path)
-    root = ET.parse(entity_path).getroot()
-    hpl_static_objects = HPLMapTrackEntity.from_xml(root)
-    for section in hpl_static_objects.sections:
-        collections = {}
-        file_list = section.files
-        entity_collection_master = get_or_create_collection("EntitiesSource", bpy.context.scene.collection)
-
-        for file in file_list:
-            ent_path = game_root / file.path
-            if not ent_path.exists():
-                print(f"Missing {ent_path} file")
-                file_collection = get_or_create_collection(file.path.stem, entity_collection_master)
-                obj = bpy.data.objects.new(ent_path.stem, None)
-                obj.empty_display_size = 1
-                file_collection.objects.link(obj)
-                continue
-            collections[file.id] = load_ent(game_root, ent_path, entity_collection_master, game)
-        exclude_collection(entity_collection_master)
+    if records is None:
+        records = _iter_hpl3_track(entity_path, HPLMapTrackEntity, Entity, streaming)
+    for _, group in groupby(records, key=lambda item: (item[0], id(item[1]))):
+        _, files, first = next(group)
+        collections = _load_entity_files(game_root, files, game, prefetch)
+        load_entities(chain((first,), (entity for _, _, entity in group)), parent_object, collections, game)
 
-        for entity in section.objects:
-            load_entity(entity, parent_object, collections, game)
 
-
-def load_hpl3_static_objects(game_root: Path, static_objects_path: Path, parent_object: bpy.types.Object, game: Game):
+def load_hpl3_static_objects(game_root: Path, static_objects_path: Path, parent_object: bpy.types.Object, game: Game,
+                             streaming: bool = False, records: Optional[Iterable[TrackRecord]] = None,
+                             prefetch: bool = True):
     print("Loading static props from", static_objects_path)
-    root = ET.parse(static_objects_path).getroot()
-    hpl_static_objects = HPLMapTrackStaticObject.from_xml(root)
+    collection_instances = get_or_create_collection("StaticObjectsInstances", bpy.context.scene.collection)
+    if records is None:
+        records = _iter_hpl3_static_objects(static_objects_path, streaming)
+    for section_name, files, columns in records:
+        collections = load_static_object_files(files, game, game_root, prefetch)
+        for obj in create_static_objects(columns, collections, parent_object, collection_instances):
+            obj["entity_data"]["entity"]["edited_by"] = section_name
+
+
+def _create_markers(records: Iterable[TrackRecord], collection: bpy.types.Collection, parent_object: bpy.types.Object,
+                    display_type: str, display_size: float):
+    for section_name, group in groupby(records, key=lambda item: item[0]):
+        markers = [record for _, _, record in group]
+        for marker, matrix in zip(markers, object_matrices(markers)):
+            obj = bpy.data.objects.new(marker.name, None)
+            obj.empty_display_type = display_type
+            obj.empty_display_size = display_size
+            obj.matrix_local = Matrix(matrix)
+            obj.hide_render = True
+            obj.parent = parent_object
+            collection.objects.link(obj)
+            obj["entity_data"] = {}
+            obj["entity_data"]["entity"] = marker.as_dict()
+            obj["entity_data"]["entity"]["edited_by"] = section_name
+
+
+def load_hpl3_areas(game_root: Path, area_path: Path, parent_object: bpy.types.Object, game: Game,
+                    streaming: bool = False, records: Optional[Iterable[TrackRecord]] = None):
+    print("Loading areas from", area_path)
+    collection = get_or_create_collection("Areas", bpy.context.scene.collection)
+    if records is None:
+        records = _iter_hpl3_track(area_path, HPLMapTrackArea, Area, streaming)
+    # Area scale is the full box size, a unit cube empty spans [-1, 1]
+    _create_markers(records, collection, parent_object, 'CUBE', 0.5)
 
-    for section in hpl_static_objects.sections:
-        objects = load_static_objects(section.files, game, game_root, parent_object, section.objects)
-        for obj, s_obj in zip(objects, section.objects):
-            obj["entity_data"]["entity"]["edited_by"] = section.name
-            obj["entity_data"]["entity"]["created"] = str(s_obj.creation)
-            obj["entity_data"]["entity"]["modified"] = str(s_obj.modification)
 
+def load_hpl3_compounds(game_root: Path, compound_path: Path, parent_object: bpy.types.Object, game: Game,
+                        streaming: bool = False, records: Optional[Iterable[TrackRecord]] = None):
+    print("Loading compounds from", compound_path)
+    collection = get_or_create_collection("Compounds", bpy.context.scene.collection)
+    if records is None:
+        records = _iter_hpl3_track(compound_path, HPLMapTrackCompound, Compound, streaming)
+    _create_markers(records, collection, parent_object, 'PLAIN_AXES', 1)
 
-def load_hpl3_detail_meshes(game_root: Path, detail_mesh_path: Path, parent_object: bpy.types.Object, game: Game):
+
+def load_hpl3_detail_meshes(game_root: Path, detail_mesh_path: Path, parent_object: bpy.types.Object, game: Game,
+                            point_cloud: bool = False, sections: Optional[list[DetailMeshSection]] = None):
     print("Loading detail meshes from", detail_mesh_path)
-    root = ET.parse(detail_mesh_path).getroot()
-    hpl_detail_meshes = HPLMapTrackDetailMeshes.from_xml(root)
+    if sections is None:
+        sections = _read_detail_mesh_sections(detail_mesh_path)
     instance_collection = get_or_create_collection("DetailMeshesInstances", bpy.context.scene.collection)
     source_collection = get_or_create_collection("DetailMeshesSource", bpy.context.scene.collection)
     exclude_collection(source_collection)
-    for section in hpl_detail_meshes.sections:
+    for section in sections:
         for detail_mesh in section.objects:
             mesh_collection = get_or_create_collection(detail_mesh.file.stem, source_collection)
             load_msh(game_root, game_root / detail_mesh.file.with_suffix(".msh"), mesh_collection, game)
             # mesh_obj.parent = parent_object
 
-            for i, (id_, pos, rot, rad, col, mod) in enumerate(
-                zip(detail_mesh.ids, detail_mesh.positions, detail_mesh.rotations, detail_mesh.radii,
-                    detail_mesh.colors, detail_mesh.mod_stamps)):
+            if point_cloud:
+                rotations = matrices_to_euler(quaternion_to_matrices(detail_mesh.rotations))
+                obj = create_point_instancer(f"{section.name}_{detail_mesh.file.stem}", detail_mesh.positions,
+                                             rotations, detail_mesh.radii, mesh_collection, detail_mesh.ids,
+                                             detail_mesh.mod_stamps)
+                obj.parent = parent_object
+                instance_collection.objects.link(obj)
+                obj["entity_data"] = {}
+                obj["entity_data"]["entity"] = {"edited_by": section.name}
+                continue
+            matrices = compose_quaternion_matrices(detail_mesh.positions, detail_mesh.rotations, detail_mesh.radii)
+            for i, (matrix, mod) in enumerate(zip(matrices, detail_mesh.mod_stamps)):
                 obj = bpy.data.objects.new(f"{detail_mesh.file.stem}_{i}", None)
                 obj.empty_display_size = 1
                 obj.instance_type = 'COLLECTION'
                 obj.instance_collection = mesh_collection
-                obj.matrix_local = Matrix.LocRotScale(Vector(pos),
-                                                      Quaternion(rot),
-                                                      Vector((rad, rad, rad)))
+                obj.matrix_local = Matrix(matrix)
                 obj.parent = parent_object
                 instance_collection.objects.link(obj)
                 obj["entity_data"] = {}
                 obj["entity_data"]["entity"] = {"edited_by": section.name, "modified": str(mod)}
 
 
-def load_hpl3_map(game_root: Path, map_path: Path, parent_object: bpy.types.Object, game: Game):
-    # load_area(game_root, map_path.with_suffix(".hpm_Area"), root, game)
-    # load_compound(game_root, map_path.with_suffix(".hpm_Compound"), root, game)
-    load_hpl3_decals(game_root, map_path.with_suffix(".hpm_Decal"), parent_object, game)
-    load_hpl3_detail_meshes(game_root, map_path.with_suffix(".hpm_DetailMeshes"), parent_object, game)
-    load_hpl3_primitive(game_root, map_path.with_suffix(".hpm_Primitive"), parent_object, game)
-    load_hpl3_static_objects(game_root, map_path.with_suffix(".hpm_StaticObject"), parent_object, game)
-    load_hpl3_entities(game_root, map_path.with_suffix(".hpm_Entity"), parent_object, game)
+def _read_detail_mesh_sections(detail_mesh_path: Path):
+    return HPLMapTrackDetailMeshes.from_xml(parse_xml(detail_mesh_path)).sections
+
+
+def _read_hpl3_track(track_path: Path, reader):
+    start = time.perf_counter()
+    if not track_path.exists():
+        return [], time.perf_counter() - start
+    with timed("track.read", track=track_path.suffix):
+        records = list(reader(track_path))
+    return records, time.perf_counter() - start
+
+
+def _counted(records: Iterable, counter: list[int]):
+    # Hands records through lazily, counting them for the per-track summary
+    for record in records:
+        counter[0] += 1
+        yield record
+
+
+def _section_files(records: list[TrackRecord]):
+    files = {}
+    for _, section_files, _ in records:
+        files[id(section_files)] = section_files
+    return [file for section_files in files.values() for file in section_files]
+
+
+def _prefetch_hpl3_assets(game_root: Path, game: Game, tracks: dict[str, list]):
+    materials = prefetch_assets(
+        game_root, game,
+        meshes=([game_root / file.path.with_suffix(".msh") for file in _section_files(tracks[".hpm_StaticObject"])] +
+                [game_root / detail_mesh.file.with_suffix(".msh")
+                 for section in tracks[".hpm_DetailMeshes"] for detail_mesh in section.objects]),
+        entities=[game_root / file.path for file in _section_files(tracks[".hpm_Entity"])],
+        materials=([file.path for file in _section_files(tracks[".hpm_Decal"])] +
+                   [plane.material for _, _, plane in tracks[".hpm_Primitive"] if plane.material]))
+    prepare_map_textures(game_root, materials)
+
+
+def load_hpl3_map(game_root: Path, map_path: Path, parent_object: bpy.types.Object, game: Game,
+                  streaming: bool = False, detail_point_cloud: bool = False):
+    # Without streaming, track files are read and deserialized concurrently and built on the main thread in this
+    # order. With streaming, each track is built straight from its lazy reader so only one record is held at a time.
+    tracks = [
+        (".hpm_Decal", "records", lambda path: _iter_hpl3_track(path, HPLMapTrackDecal, Decal, streaming),
+         lambda path, records: load_hpl3_decals(game_root, path, parent_object, game, records=records)),
+        (".hpm_DetailMeshes", "sections", _read_detail_mesh_sections,
+         lambda path, sections: load_hpl3_detail_meshes(game_root, path, parent_object, game, detail_point_cloud,
+                                                        sections)),
+        (".hpm_Primitive", "records", lambda path: _iter_hpl3_track(path, HPLMapTrackPrimitive, Primitive, streaming),
+         lambda path, records: load_hpl3_primitive(game_root, path, parent_object, game, records=records)),
+        (".hpm_StaticObject", "sections", lambda path: _iter_hpl3_static_objects(path, streaming),
+         lambda path, records: load_hpl3_static_objects(game_root, path, parent_object, game, records=records,
+                                                        prefetch=streaming)),
+        (".hpm_Entity", "records", lambda path: _iter_hpl3_track(path, HPLMapTrackEntity, Entity, streaming),
+         lambda path, records: load_hpl3_entities(game_root, path, parent_object, game, records=records,
+                                                  prefetch=streaming)),
+        (".hpm_Area", "records", lambda path: _iter_hpl3_track(path, HPLMapTrackArea, Area, streaming),
+         lambda path, records: load_hpl3_areas(game_root, path, parent_object, game, records=records)),
+        (".hpm_Compound", "records", lambda path: _iter_hpl3_track(path, HPLMapTrackCompound, Compound, streaming),
+         lambda path, records: load_hpl3_compounds(game_root, path, parent_object, game, records=records)),
+    ]
+    timings = []
+    if streaming:
+        for suffix, unit, reader, build in tracks:
+            track_path = map_path.with_suffix(suffix)
+            start = time.perf_counter()
+            counter = [0]
+            if track_path.exists():
+                with timed("track.build", track=suffix):
+                    build(track_path, _counted(reader(track_path), counter))
+            count("track.records", counter[0])
+            timings.append((suffix, unit, counter[0], None, time.perf_counter() - start))
+    else:
+        with ThreadPoolExecutor(len(tracks)) as pool:
+            futures = [pool.submit(_read_hpl3_track, map_path.with_suffix(suffix), reader)
+                       for suffix, _, reader, _ in tracks]
+            results = [future.result() for future in futures]
+        _prefetch_hpl3_assets(game_root, game,
+                              {suffix: records for (suffix, _, _, _), (records, _) in zip(tracks, results)})
+        for (suffix, unit, _, build), (records, read_time) in zip(tracks, results):
+            start = time.perf_counter()
+            count("track.records", len(records))
+            if records:
+                with timed("track.build", track=suffix):
+                    build(map_path.with_suffix(suffix), records)
+            timings.append((suffix, unit, len(records), read_time, time.perf_counter() - start))
+    print(f"Loaded {map_path.name}:")
+    for suffix, unit, record_count, read_time, build_time in timings:
+        if read_time is None:
+            print(f"\t{suffix}: {record_count} {unit}, streamed {build_time:.3f}s")
+        else:
+            print(f"\t{suffix}: {record_count} {unit}, read {read_time:.3f}s, build {build_time:.3f}s")
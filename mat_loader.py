@@ -1,51 +1,265 @@
+import hashlib
+import time
 from pathlib import Path
-import xml.etree.ElementTree as ET
+from typing import Iterable
 
 import bpy
 
 from UniLoader.common_api.material_utils import create_node_group
 from .common_utils import find_file_v2
 from .game import Game
+from .profiling import count, profiled, timed
 from .resource_types.hpl2.mat import Mat
-from ...common_api import Texture,create_node, Nodes, connect_nodes, clear_nodes, create_texture_node, \
+from .resource_types.xml_backend import parse_xml
+from .texture_cache import TextureManifest, prefetch_texture_bytes, prefill_texture_cache, texture_source, \
+    transcode_dds, get_texture_preview_level
+from ...common_api import create_node, Nodes, connect_nodes, clear_nodes, create_texture_node, \
     connect_nodes_group
 
 
 
+_MAT_CACHE: dict[str, Mat] = {}
+# .mat reference (as written and as resolved) -> (bpy material name, resolved source)
+_MATERIAL_REGISTRY: dict[str, tuple[str, str]] = {}
+# Resolved texture path -> bpy image name
+_LOADED_IMAGES: dict[str, str] = {}
+_texture_bytes = 0
+_texture_count = 0
+# Material signature -> (bpy material name, signature digest) of the first material built with that node graph
+_MATERIAL_TEMPLATES: dict[tuple, tuple[str, str]] = {}
+
+
+def clear_mat_cache():
+    _MAT_CACHE.clear()
+
+
+def read_mat(material_path: Path) -> Mat:
+    key = str(material_path.absolute()).lower()
+    cached = _MAT_CACHE.get(key)
+    if cached is not None:
+        count("mat.cache_hits")
+        return cached
+    count("mat.cache_misses")
+    with timed("mat.parse", path=str(material_path)):
+        mat = Mat.from_xml(parse_xml(material_path))
+    _MAT_CACHE[key] = mat
+    return mat
+
+
+def build_texture_manifest(game_root: Path, material_paths: Iterable[Path]):
+    # Resolved texture files referenced by already resolved .mat files
+    manifest = TextureManifest()
+    for material_path in material_paths:
+        for texture in read_mat(material_path).material.textures.values():
+            if texture.file is None:
+                continue
+            texture_path = texture.file if texture.file.suffix != "" else texture.file.with_suffix(".dds")
+            resolved = find_file_v2(game_root, texture_path, record_miss=False)
+            if resolved is not None:
+                manifest.add(resolved)
+    return manifest
+
+
+@profiled("texture.prepare")
+def prepare_map_textures(game_root: Path, material_paths: Iterable[Path]):
+    start = time.perf_counter()
+    manifest = build_texture_manifest(game_root, material_paths)
+    prefill_texture_cache(manifest.files.values())
+    total_bytes = prefetch_texture_bytes(manifest)
+    print(f"Texture manifest: {len(manifest)} unique textures, {total_bytes / (1024 * 1024):.1f} MB prefetched "
+          f"in {time.perf_counter() - start:.3f}s")
+    return manifest
+
+
+def reset_texture_stats():
+    global _texture_bytes, _texture_count
+    _texture_bytes = 0
+    _texture_count = 0
+
+
+def report_texture_stats():
+    if _texture_count:
+        print(f"Loaded {_texture_count} textures, {_texture_bytes / (1024 * 1024):.1f} MB total")
+
+
+def _loaded_image(key: str):
+    name = _LOADED_IMAGES.get(key)
+    if name is None:
+        return None
+    image = bpy.data.images.get(name)
+    if image is None or image.get("hpl_source") != key:
+        return None
+    return image
+
+
+def _registered_material(key: str):
+    entry = _MATERIAL_REGISTRY.get(key)
+    if entry is None:
+        return None
+    name, source = entry
+    material = bpy.data.materials.get(name)
+    if material is None or material.get("hpl_source") != source:
+        return None
+    return material
+
+
+def _use_material(obj: bpy.types.Object, placeholder: bpy.types.Material, material: bpy.types.Material):
+    count("mat.reused")
+    if placeholder == material:
+        return
+    for slot in obj.material_slots:
+        if slot.material == placeholder:
+            slot.material = material
+    if placeholder.users == 0:
+        bpy.data.materials.remove(placeholder)
+
+
+@profiled("texture.load")
 def load_texture(game_root: Path, material_path: Path, texture_path: Path):
-    if texture_path.stem + ".tga" in bpy.data.images:
-        return bpy.data.images[texture_path.stem + ".tga"]
+    global _texture_bytes, _texture_count
     if texture_path.suffix == "":
         texture_path = texture_path.with_suffix(".dds")
 
     resolved_real_path = find_file_v2(game_root, texture_path)
+    source_key = str(resolved_real_path).lower() if resolved_real_path is not None else None
+    image = _loaded_image(source_key) if source_key is not None else None
+    if image is not None:
+        count("texture.deduplicated")
+        return image
+    if resolved_real_path is None and texture_path.stem + ".tga" in bpy.data.images:
+        return bpy.data.images[texture_path.stem + ".tga"]
     if resolved_real_path is not None:
         print(f"Loading {resolved_real_path}")
 
-        if resolved_real_path.with_suffix(".tga").exists():
-            image = bpy.data.images.load(str(resolved_real_path.with_suffix(".tga")))
-        else:
-            image = bpy.data.images.load(str(resolved_real_path))
-            if image.channels == 0:
-                bpy.data.images.remove(image)
-                texture = Texture.from_dds(resolved_real_path)
-                print(f"Found unsupported texture: {resolved_real_path}: {texture.pixel_format.name}")
-                texture.write_tga(resolved_real_path.with_suffix(".tga"))
-                image = bpy.data.images.load(str(resolved_real_path.with_suffix(".tga")))
+        source = texture_source(resolved_real_path)
+        preview_level = get_texture_preview_level() if source != texture_source(resolved_real_path, 0) else 0
+        image = bpy.data.images.load(str(source))
+        if image.channels == 0 and source.suffix.lower() == ".dds":
+            bpy.data.images.remove(image)
+            source = transcode_dds(source)
+            image = bpy.data.images.load(str(source))
+        if source != resolved_real_path:
+            # Display name only, images are identified by hpl_source
+            image.name = resolved_real_path.name
 
         image["channels"] = image.channels
+        image["hpl_source"] = source_key
+        image["hpl_full_source"] = str(resolved_real_path)
+        image["hpl_preview"] = preview_level
         image.alpha_mode = 'CHANNEL_PACKED'
+        _LOADED_IMAGES[source_key] = image.name
+        _texture_bytes += source.stat().st_size
+        _texture_count += 1
         return image
     else:
         print(f"Failed to load {texture_path.name} texture")
         return None
 
 
+@profiled("texture.upgrade")
+def upgrade_preview_textures():
+    # Swaps every image loaded from a reduced mip level for its full resolution source, in place,
+    # so materials and node trees referencing the image pick it up without being rebuilt
+    upgraded = 0
+    for image in bpy.data.images:
+        if not image.get("hpl_preview") or "hpl_full_source" not in image:
+            continue
+        source = texture_source(Path(image["hpl_full_source"]), 0)
+        image.filepath = str(source)
+        image.reload()
+        if image.channels == 0 and source.suffix.lower() == ".dds":
+            image.filepath = str(transcode_dds(source))
+            image.reload()
+        image["channels"] = image.channels
+        image["hpl_preview"] = 0
+        upgraded += 1
+    count("texture.upgraded", upgraded)
+    return upgraded
+
+
+def _texture_node(material: bpy.types.Material, image: bpy.types.Image, texture_type: str):
+    node = create_texture_node(material, image, texture_type)
+    node["hpl_texture"] = texture_type
+    return node
+
+
+def _set_variable_value(node: bpy.types.Node, value):
+    if isinstance(value, str):
+        return
+    if isinstance(value, list) and len(value) < 4:
+        value = value + [0, 0, 0, 0][:4 - len(value)]
+    node.outputs[0].default_value = value
+
+
+def _material_signature(game: Game, xml_material, textures: dict[str, bpy.types.Image]):
+    # Everything that changes the shape of the node graph built by generate_material_nodes
+    return (game.value,
+            xml_material.main.type.lower(),
+            xml_material.main.blend_mode.lower(),
+            bool(xml_material.main.use_alpha),
+            tuple(sorted((texture_type, image.get("channels", 0) == 4) for texture_type, image in textures.items())),
+            tuple(sorted((name, type(value).__name__) for name, value in xml_material.variables.items())))
+
+
+def _signature_digest(signature: tuple):
+    return hashlib.sha1(repr(signature).encode("utf8")).hexdigest()[:16]
+
+
+def _material_template(signature: tuple):
+    entry = _MATERIAL_TEMPLATES.get(signature)
+    if entry is None:
+        return None
+    name, digest = entry
+    template = bpy.data.materials.get(name)
+    if template is None or template.get("hpl_template") != digest:
+        return None
+    return template
+
+
+def _clone_template(template: bpy.types.Material, placeholder: bpy.types.Material):
+    clone = template.copy()
+    name = placeholder.name
+    placeholder.user_remap(clone)
+    bpy.data.materials.remove(placeholder)
+    clone.name = name
+    return clone
+
+
+def _apply_material_parameters(material: bpy.types.Material, xml_material, textures: dict[str, bpy.types.Image],
+                               obj: bpy.types.Object):
+    variables = xml_material.variables
+    for node in material.node_tree.nodes:
+        texture_type = node.get("hpl_texture")
+        if texture_type is not None and texture_type in textures:
+            image = textures[texture_type]
+            if node.image is not None and node.image.colorspace_settings.is_data:
+                image.colorspace_settings.is_data = True
+                image.colorspace_settings.name = 'Non-Color'
+            node.image = image
+        variable = node.get("hpl_variable")
+        if variable is not None and variable in variables:
+            _set_variable_value(node, variables[variable])
+        uv_scale = node.get("hpl_uv_scale")
+        if uv_scale is not None:
+            scale = float(variables.get(uv_scale, 1))
+            if node.get("hpl_uv_inverse"):
+                scale = 1 / scale
+            node.inputs[1].default_value = (scale, scale, scale)
+        if node.get("hpl_object"):
+            node.object = obj
+        if node.type == 'GROUP':
+            if "HeightMapScale" in node.inputs and "Height" in textures:
+                node.inputs["HeightMapScale"].default_value = xml_material.main.height_map_scale
+                node.inputs["HeightMapBias"].default_value = xml_material.main.height_map_bias
+            if "Refraction" in node.inputs:
+                node.inputs["Refraction"].default_value = variables.get("Refraction", 0)
+
+
 def _add_normal(material: bpy.types.Material, image: bpy.types.Image):
     if image is not None:
         image.colorspace_settings.is_data = True
         image.colorspace_settings.name = 'Non-Color'
-    normal_node = create_texture_node(material, image, "normal")
+    normal_node = _texture_node(material, image, "NMap")
     split_rgb = create_node(material, Nodes.ShaderNodeSeparateRGB)
     connect_nodes(material, normal_node.outputs[0], split_rgb.inputs[0])
     combine_rgb = create_node(material, Nodes.ShaderNodeCombineRGB)
@@ -217,25 +431,38 @@ def check_supported_textures(name: str, material_type: str, textures: dict[str,
             print("\t", texture)
 
 
+@profiled("mat.build")
 def generate_material_nodes(game_root: Path,
                             material_path: Path,
                             material: bpy.types.Material,
                             obj: bpy.types.Object,
                             game: Game):
     load_material_nodes()
+    reference_key = f"{game.value}:{str(material_path).lower()}"
+    registered = _registered_material(reference_key)
+    if registered is not None:
+        _use_material(obj, material, registered)
+        return
     if material.get("LOADED", False):
         return
+    material_path = find_file_v2(game_root, material_path)
+    if material_path is not None and material_path.is_file():
+        source_key = f"{game.value}:{str(material_path).lower()}"
+        registered = _registered_material(source_key)
+        if registered is not None:
+            _MATERIAL_REGISTRY[reference_key] = _MATERIAL_REGISTRY[source_key]
+            _use_material(obj, material, registered)
+            return
     material["LOADED"] = True
     material.use_nodes = True
 
     clear_nodes(material)
-    material_path = find_file_v2(game_root, material_path)
     if material_path is None or not material_path.is_file():
         print("Failed to find", material_path)
         return
-    with material_path.open("r") as f:
-        element = ET.fromstring(f.read())
-    xml_material = Mat.from_xml(element).material
+    material["hpl_source"] = source_key
+    _MATERIAL_REGISTRY[reference_key] = _MATERIAL_REGISTRY[source_key] = material.name, source_key
+    xml_material = read_mat(material_path).material
     textures = {}
     for texture_type, texture in xml_material.textures.items():
         if texture.file is None:
@@ -245,6 +472,18 @@ def generate_material_nodes(game_root: Path,
             continue
         textures[texture_type] = image
 
+    signature = _material_signature(game, xml_material, textures)
+    template = _material_template(signature)
+    if template is not None:
+        # Same node graph as an already built material, copy it and swap in this material's images and values
+        material = _clone_template(template, material)
+        material["LOADED"] = True
+        material["hpl_source"] = source_key
+        _MATERIAL_REGISTRY[reference_key] = _MATERIAL_REGISTRY[source_key] = material.name, source_key
+        _apply_material_parameters(material, xml_material, textures, obj)
+        count("mat.cloned")
+        return
+
     output_node = create_node(material, Nodes.ShaderNodeOutputMaterial)
     material_type = xml_material.main.type.lower()
     blend_mode = xml_material.main.blend_mode.lower()
@@ -263,37 +502,37 @@ def generate_material_nodes(game_root: Path,
             shader_node = create_node_group(material, "soliddiffuse")
             alpha_output = None
             if "Diffuse" in textures:
-                albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                 connect_nodes(material, albedo_node.outputs[0], shader_node.inputs["Diffuse"])
                 if xml_material.main.use_alpha:
                     alpha_output = albedo_node.outputs[1]
             if "NMap" in textures:
-                nmap_node = create_texture_node(material, textures["NMap"], "NMap")
+                nmap_node = _texture_node(material, textures["NMap"], "NMap")
                 nmap_node.image.colorspace_settings.is_data = True
                 nmap_node.image.colorspace_settings.name = 'Non-Color'
                 connect_nodes(material, nmap_node.outputs[0], shader_node.inputs["NMap"])
             if "Height" in textures:
-                height_node = create_texture_node(material, textures["Height"], "Height")
+                height_node = _texture_node(material, textures["Height"], "Height")
                 height_node.image.colorspace_settings.is_data = True
                 height_node.image.colorspace_settings.name = 'Non-Color'
                 connect_nodes(material, height_node.outputs[0], shader_node.inputs["Height"])
                 shader_node.inputs["HeightMapScale"].default_value = xml_material.main.height_map_scale
                 shader_node.inputs["HeightMapBias"].default_value = xml_material.main.height_map_bias
             if "Alpha" in textures:
-                alpha_node = create_texture_node(material, textures["Alpha"], "Alpha")
+                alpha_node = _texture_node(material, textures["Alpha"], "Alpha")
                 if textures["Alpha"]["channels"] == 4:
                     alpha_output = alpha_node.outputs[1]
                 else:
                     alpha_output = alpha_node.outputs[0]
             if "Specular" in textures:
-                specular_node = create_texture_node(material, textures["Specular"], "Specular")
+                specular_node = _texture_node(material, textures["Specular"], "Specular")
                 specular_node.image.colorspace_settings.is_data = True
                 specular_node.image.colorspace_settings.name = 'Non-Color'
                 connect_nodes(material, specular_node.outputs[0], shader_node.inputs["Specular"])
             else:
                 shader_node.inputs["Specular"].default_value = (0, 0, 0, 1)
             if "Illumination" in textures:
-                illumination_node = create_texture_node(material, textures["Illumination"], "Illumination")
+                illumination_node = _texture_node(material, textures["Illumination"], "Illumination")
                 connect_nodes(material, illumination_node.outputs[0], shader_node.inputs["Illumination"])
 
             if alpha_output is not None:
@@ -302,6 +541,7 @@ def generate_material_nodes(game_root: Path,
                 connect_nodes(material, alpha_output, shader_node.inputs["Alpha"])
             for vv, v in xml_material.variables.items():
                 node = create_node(material, Nodes.ShaderNodeValue, vv)
+                node["hpl_variable"] = vv
                 node.outputs[0].default_value = v
             shader_output = shader_node.outputs[0]
         elif material_type == "translucent":
@@ -315,23 +555,23 @@ def generate_material_nodes(game_root: Path,
             shader_node = create_node_group(material, "translucent")
             alpha_output = None
             if "Diffuse" in textures:
-                albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                 connect_nodes(material, albedo_node.outputs[0], shader_node.inputs["Diffuse"])
                 if xml_material.main.use_alpha:
                     alpha_output = albedo_node.outputs[1]
             if "NMap" in textures:
-                nmap_node = create_texture_node(material, textures["NMap"], "NMap")
+                nmap_node = _texture_node(material, textures["NMap"], "NMap")
                 nmap_node.image.colorspace_settings.is_data = True
                 nmap_node.image.colorspace_settings.name = 'Non-Color'
                 connect_nodes(material, nmap_node.outputs[0], shader_node.inputs["NMap"])
             if "Alpha" in textures:
-                alpha_node = create_texture_node(material, textures["Alpha"], "Alpha")
+                alpha_node = _texture_node(material, textures["Alpha"], "Alpha")
                 if textures["Alpha"]["channels"] == 4:
                     alpha_output = alpha_node.outputs[1]
                 else:
                     alpha_output = alpha_node.outputs[0]
             if "CubeMapAlpha" in textures:
-                alpha_node = create_texture_node(material, textures["CubeMapAlpha"], "CubeMapAlpha")
+                alpha_node = _texture_node(material, textures["CubeMapAlpha"], "CubeMapAlpha")
                 alpha_output = alpha_node.outputs[1]
             if alpha_output is not None:
                 material.blend_method = 'HASHED'
@@ -348,7 +588,7 @@ def generate_material_nodes(game_root: Path,
                 shader_node = create_node_group(material, "decal")
                 alpha_output = None
                 if "Diffuse" in textures:
-                    albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                    albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                     connect_nodes(material, albedo_node.outputs[0], shader_node.inputs["Diffuse"])
                     alpha_output = albedo_node.outputs[1]
                 if alpha_output is not None:
@@ -358,14 +598,14 @@ def generate_material_nodes(game_root: Path,
             elif blend_mode == "mul":
                 shader_node = create_node(material, Nodes.ShaderNodeBsdfTransparent, "decal")
                 if "Diffuse" in textures:
-                    albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                    albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                     connect_nodes(material, albedo_node.outputs[0], shader_node.inputs[0])
                 material.blend_method = 'BLEND'
                 material.shadow_method = 'CLIP'
             elif blend_mode == "mulx2":
                 shader_node = create_node(material, Nodes.ShaderNodeBsdfTransparent, "decal")
                 if "Diffuse" in textures:
-                    albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                    albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                     connect_nodes(material, albedo_node.outputs[0], shader_node.inputs[0])
                 material.blend_method = 'BLEND'
                 material.shadow_method = 'CLIP'
@@ -374,6 +614,7 @@ def generate_material_nodes(game_root: Path,
                 print("Unsupported decal blend type", xml_material.main.blend_mode)
             for vv, v in xml_material.variables.items():
                 node = create_node(material, Nodes.ShaderNodeValue, vv)
+                node["hpl_variable"] = vv
                 node.outputs[0].default_value = v
             shader_output = shader_node.outputs[0]
         else:
@@ -467,13 +708,13 @@ def generate_material_nodes(game_root: Path,
             material.blend_method = 'HASHED'
 
             if "Alpha" in textures:
-                specular_node = create_texture_node(material, textures["Alpha"], "Alpha")
+                specular_node = _texture_node(material, textures["Alpha"], "Alpha")
                 connect_nodes(material, specular_node.outputs[1], alpha_input)
             if "Diffuse" in textures:
-                albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                 connect_nodes(material, albedo_node.outputs[0], color_input)
             if "Specular" in textures:
-                specular_node = create_texture_node(material, textures["Specular"], "specular")
+                specular_node = _texture_node(material, textures["Specular"], "Specular")
                 invert_node = create_node(material, Nodes.ShaderNodeInvert)
                 connect_nodes(material, specular_node.outputs[1], invert_node.inputs[1])
                 connect_nodes(material, invert_node.outputs[0], roughness_input)
@@ -493,7 +734,7 @@ def generate_material_nodes(game_root: Path,
             shader_output = shader_mix.outputs[0]
 
             if "Diffuse" in textures:
-                albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                 connect_nodes(material, albedo_node.outputs[0], diffuse_node.inputs[0])
                 connect_nodes(material, albedo_node.outputs[1], alpha_input)
         elif material_type == "vertexblend":
@@ -563,61 +804,67 @@ def generate_material_nodes(game_root: Path,
 
             r_scale = create_node(material, Nodes.ShaderNodeVectorMath)
             r_scale.operation = "MULTIPLY"
+            r_scale["hpl_uv_scale"] = "TextureUVScaleSide"
+            r_scale["hpl_uv_inverse"] = True
             connect_nodes(material, uv_node.outputs[0], r_scale.inputs[0])
             tmp = 1 / float(xml_material.variables.get("TextureUVScaleSide", 1))
             r_scale.inputs[1].default_value = (tmp, tmp, tmp)
 
             g_scale = create_node(material, Nodes.ShaderNodeVectorMath)
             g_scale.operation = "MULTIPLY"
+            g_scale["hpl_uv_scale"] = "TextureUVScaleTop"
+            g_scale["hpl_uv_inverse"] = True
             connect_nodes(material, uv_node.outputs[0], g_scale.inputs[0])
             tmp = 1 / float(xml_material.variables.get("TextureUVScaleTop", 1))
             g_scale.inputs[1].default_value = (tmp, tmp, tmp)
 
             b_scale = create_node(material, Nodes.ShaderNodeVectorMath)
             b_scale.operation = "MULTIPLY"
+            b_scale["hpl_uv_scale"] = "TextureUVScaleBottom"
+            b_scale["hpl_uv_inverse"] = True
             connect_nodes(material, uv_node.outputs[0], b_scale.inputs[0])
             tmp = 1 / float(xml_material.variables.get("TextureUVScaleBottom", 1))
             b_scale.inputs[1].default_value = (tmp, tmp, tmp)
 
             if "Diffuse_R" in textures:
-                diffuse = create_texture_node(material, textures["Diffuse_R"], "Diffuse_R")
+                diffuse = _texture_node(material, textures["Diffuse_R"], "Diffuse_R")
                 connect_nodes(material, diffuse.outputs[0], diffuse_rgb_mixer.inputs[1])
                 connect_nodes(material, r_scale.outputs[0], diffuse.inputs[0])
             if "Diffuse_G" in textures:
-                diffuse = create_texture_node(material, textures["Diffuse_G"], "Diffuse_G")
+                diffuse = _texture_node(material, textures["Diffuse_G"], "Diffuse_G")
                 connect_nodes(material, diffuse.outputs[0], diffuse_rgb_mixer.inputs[2])
                 connect_nodes(material, g_scale.outputs[0], diffuse.inputs[0])
             if "Diffuse_B" in textures:
-                diffuse = create_texture_node(material, textures["Diffuse_B"], "Diffuse_B")
+                diffuse = _texture_node(material, textures["Diffuse_B"], "Diffuse_B")
                 connect_nodes(material, diffuse.outputs[0], diffuse_rgb_mixer.inputs[3])
                 connect_nodes(material, b_scale.outputs[0], diffuse.inputs[0])
 
             if "Specular_R" in textures:
-                specular = create_texture_node(material, textures["Specular_R"], "Specular_R")
+                specular = _texture_node(material, textures["Specular_R"], "Specular_R")
                 connect_nodes(material, specular.outputs[0], specular_rgb_mixer.inputs[1])
                 connect_nodes(material, specular.outputs[1], roughness_rgb_mixer.inputs[1])
                 connect_nodes(material, r_scale.outputs[0], specular.inputs[0])
             if "Specular_G" in textures:
-                specular = create_texture_node(material, textures["Specular_G"], "Specular_G")
+                specular = _texture_node(material, textures["Specular_G"], "Specular_G")
                 connect_nodes(material, specular.outputs[0], specular_rgb_mixer.inputs[2])
                 connect_nodes(material, specular.outputs[1], roughness_rgb_mixer.inputs[2])
                 connect_nodes(material, g_scale.outputs[0], specular.inputs[0])
             if "Specular_B" in textures:
-                specular = create_texture_node(material, textures["Specular_B"], "Specular_B")
+                specular = _texture_node(material, textures["Specular_B"], "Specular_B")
                 connect_nodes(material, specular.outputs[0], specular_rgb_mixer.inputs[3])
                 connect_nodes(material, specular.outputs[1], roughness_rgb_mixer.inputs[3])
                 connect_nodes(material, b_scale.outputs[0], specular.inputs[0])
 
             if "NMap_R" in textures:
-                normal = create_texture_node(material, textures["NMap_R"], "NMap_R")
+                normal = _texture_node(material, textures["NMap_R"], "NMap_R")
                 connect_nodes(material, normal.outputs[0], normal_rgb_mixer.inputs[1])
                 connect_nodes(material, r_scale.outputs[0], normal.inputs[0])
             if "NMap_G" in textures:
-                normal = create_texture_node(material, textures["NMap_G"], "NMap_G")
+                normal = _texture_node(material, textures["NMap_G"], "NMap_G")
                 connect_nodes(material, normal.outputs[0], normal_rgb_mixer.inputs[2])
                 connect_nodes(material, g_scale.outputs[0], normal.inputs[0])
             if "NMap_B" in textures:
-                normal = create_texture_node(material, textures["NMap_B"], "NMap_B")
+                normal = _texture_node(material, textures["NMap_B"], "NMap_B")
                 connect_nodes(material, normal.outputs[0], normal_rgb_mixer.inputs[3])
                 connect_nodes(material, b_scale.outputs[0], normal.inputs[0])
         elif material_type == "translucent":
@@ -634,7 +881,7 @@ def generate_material_nodes(game_root: Path,
             shader_output = shader_mix.outputs[0]
 
             if "Diffuse" in textures:
-                albedo_node = create_texture_node(material, textures["Diffuse"], "Diffuse")
+                albedo_node = _texture_node(material, textures["Diffuse"], "Diffuse")
                 connect_nodes(material, albedo_node.outputs[0], glass_node.inputs["Color"])
                 connect_nodes(material, albedo_node.outputs[1], alpha_input)
             if "NMap" in textures:
@@ -678,6 +925,7 @@ def generate_material_nodes(game_root: Path,
 
             project_node = create_uv_project_group(material)
             normal_node = create_node(material, Nodes.ShaderNodeTexCoord)
+            normal_node["hpl_object"] = True
             normal_node.object = obj
             connect_nodes(material, normal_node.outputs[1], project_node.inputs[0])
 
@@ -710,61 +958,67 @@ def generate_material_nodes(game_root: Path,
 
             side_scale = create_node(material, Nodes.ShaderNodeVectorMath)
             side_scale.operation = "MULTIPLY"
+            side_scale["hpl_uv_scale"] = "TextureUVScaleSide"
+            side_scale["hpl_uv_inverse"] = False
             connect_nodes(material, uv_node.outputs[0], side_scale.inputs[0])
             tmp = float(xml_material.variables.get("TextureUVScaleSide", 1))
             side_scale.inputs[1].default_value = (tmp, tmp, tmp)
 
             top_scale = create_node(material, Nodes.ShaderNodeVectorMath)
             top_scale.operation = "MULTIPLY"
+            top_scale["hpl_uv_scale"] = "TextureUVScaleTop"
+            top_scale["hpl_uv_inverse"] = False
             connect_nodes(material, uv_node.outputs[0], top_scale.inputs[0])
             tmp = float(xml_material.variables.get("TextureUVScaleTop", 1))
             top_scale.inputs[1].default_value = (tmp, tmp, tmp)
 
             bottom_scale = create_node(material, Nodes.ShaderNodeVectorMath)
             bottom_scale.operation = "MULTIPLY"
+            bottom_scale["hpl_uv_scale"] = "TextureUVScaleBottom"
+            bottom_scale["hpl_uv_inverse"] = False
             connect_nodes(material, uv_node.outputs[0], bottom_scale.inputs[0])
             tmp = float(xml_material.variables.get("TextureUVScaleBottom", 1))
             bottom_scale.inputs[1].default_value = (tmp, tmp, tmp)
 
             if "DiffuseSide" in textures:
-                diffuse = create_texture_node(material, textures["DiffuseSide"], "DiffuseSide")
+                diffuse = _texture_node(material, textures["DiffuseSide"], "DiffuseSide")
                 connect_nodes(material, diffuse.outputs[0], diffuse_rgb_mixer.inputs[1])
                 connect_nodes(material, side_scale.outputs[0], diffuse.inputs[0])
             if "DiffuseTop" in textures:
-                diffuse = create_texture_node(material, textures["DiffuseTop"], "DiffuseTop")
+                diffuse = _texture_node(material, textures["DiffuseTop"], "DiffuseTop")
                 connect_nodes(material, diffuse.outputs[0], diffuse_rgb_mixer.inputs[2])
                 connect_nodes(material, top_scale.outputs[0], diffuse.inputs[0])
             if "DiffuseBottom" in textures:
-                diffuse = create_texture_node(material, textures["DiffuseBottom"], "DiffuseBottom")
+                diffuse = _texture_node(material, textures["DiffuseBottom"], "DiffuseBottom")
                 connect_nodes(material, diffuse.outputs[0], diffuse_rgb_mixer.inputs[3])
                 connect_nodes(material, bottom_scale.outputs[0], diffuse.inputs[0])
 
             if "SpecularSide" in textures:
-                specular = create_texture_node(material, textures["SpecularSide"], "SpecularSide")
+                specular = _texture_node(material, textures["SpecularSide"], "SpecularSide")
                 connect_nodes(material, specular.outputs[0], specular_rgb_mixer.inputs[1])
                 connect_nodes(material, specular.outputs[1], roughness_rgb_mixer.inputs[1])
                 connect_nodes(material, side_scale.outputs[0], specular.inputs[0])
             if "SpecularTop" in textures:
-                specular = create_texture_node(material, textures["SpecularTop"], "SpecularTop")
+                specular = _texture_node(material, textures["SpecularTop"], "SpecularTop")
                 connect_nodes(material, specular.outputs[0], specular_rgb_mixer.inputs[2])
                 connect_nodes(material, specular.outputs[1], roughness_rgb_mixer.inputs[2])
                 connect_nodes(material, top_scale.outputs[0], specular.inputs[0])
             if "SpecularBottom" in textures:
-                specular = create_texture_node(material, textures["SpecularBottom"], "SpecularBottom")
+                specular = _texture_node(material, textures["SpecularBottom"], "SpecularBottom")
                 connect_nodes(material, specular.outputs[0], specular_rgb_mixer.inputs[3])
                 connect_nodes(material, specular.outputs[1], roughness_rgb_mixer.inputs[3])
                 connect_nodes(material, bottom_scale.outputs[0], specular.inputs[0])
 
             if "NMapSide" in textures:
-                normal = create_texture_node(material, textures["NMapSide"], "NMapSide")
+                normal = _texture_node(material, textures["NMapSide"], "NMapSide")
                 connect_nodes(material, normal.outputs[0], normal_rgb_mixer.inputs[1])
                 connect_nodes(material, side_scale.outputs[0], normal.inputs[0])
             if "NMapTop" in textures:
-                normal = create_texture_node(material, textures["NMapTop"], "NMapTop")
+                normal = _texture_node(material, textures["NMapTop"], "NMapTop")
                 connect_nodes(material, normal.outputs[0], normal_rgb_mixer.inputs[2])
                 connect_nodes(material, top_scale.outputs[0], normal.inputs[0])
             if "NMapBottom" in textures:
-                normal = create_texture_node(material, textures["NMapBottom"], "NMapBottom")
+                normal = _texture_node(material, textures["NMapBottom"], "NMapBottom")
                 connect_nodes(material, normal.outputs[0], normal_rgb_mixer.inputs[3])
                 connect_nodes(material, bottom_scale.outputs[0], normal.inputs[0])
         else:
@@ -772,20 +1026,20 @@ def generate_material_nodes(game_root: Path,
             return
 
     connect_nodes(material, output_node.inputs[0], shader_output)
+    digest = _signature_digest(signature)
+    material["hpl_template"] = digest
+    _MATERIAL_TEMPLATES[signature] = material.name, digest
 
 
 def _generate_unsupported_material(material, textures, xml_material):
     for tt, t in textures.items():
-        create_texture_node(material, t, tt)
+        _texture_node(material, t, tt)
     for vv, v in xml_material.variables.items():
         if isinstance(v, list):
             node = create_node(material, Nodes.ShaderNodeRGB, vv)
-            if len(v) < 4:
-                v = v + [0, 0, 0, 0][:4 - len(v)]
         else:
             node = create_node(material, Nodes.ShaderNodeValue, vv)
-        if isinstance(v, str):
-            continue
-        node.outputs[0].default_value = v
+        node["hpl_variable"] = vv
+        _set_variable_value(node, v)
     diffuse_node = create_node(material, Nodes.ShaderNodeBsdfDiffuse, xml_material.main.type)
     return diffuse_node
@@ -1,3 +1,5 @@
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 import bpy
@@ -5,12 +7,78 @@ import numpy as np
 from mathutils import Vector, Matrix
 
 from UniLoader.bpy_helper import is_blender_4_1
-from UniLoader.common_api import FileBuffer
 from .common_utils import find_file_v2
 from ...common_api import create_material
 from .mat_loader import generate_material_nodes
 from .game import Game
-from .resource_types.msh import Msh, Skeleton
+from .profiling import count, profiled, timed
+from .resource_types.msh import Msh, Skeleton, SubMesh, VertexBonePair
+
+
+_MESH_CACHE: OrderedDict[tuple[str, int, int], tuple[Msh, int]] = OrderedDict()
+_MESH_CACHE_BUDGET = 512 * 1024 * 1024
+_mesh_cache_size = 0
+_MESH_CACHE_LOCK = threading.Lock()
+_MESH_DATA_REGISTRY: dict[str, str] = {}
+
+
+def set_mesh_cache_budget(budget: int):
+    global _MESH_CACHE_BUDGET
+    _MESH_CACHE_BUDGET = budget
+    with _MESH_CACHE_LOCK:
+        _trim_mesh_cache()
+
+
+def clear_mesh_cache():
+    global _mesh_cache_size
+    with _MESH_CACHE_LOCK:
+        _MESH_CACHE.clear()
+        _mesh_cache_size = 0
+
+
+def _trim_mesh_cache():
+    global _mesh_cache_size
+    while _MESH_CACHE and _mesh_cache_size > _MESH_CACHE_BUDGET:
+        _, (_, size) = _MESH_CACHE.popitem(last=False)
+        _mesh_cache_size -= size
+
+
+def _msh_size(mesh: Msh):
+    size = 0
+    for submesh in mesh.submeshes:
+        size += len(submesh.weights) * VertexBonePair.itemsize
+        size += sum(stream.size for stream in submesh.vertex_streams)
+        size += sum(indices.nbytes for _, indices in submesh.lods)
+    return size
+
+
+def read_msh(mesh_path: Path) -> Msh:
+    global _mesh_cache_size
+    stat = mesh_path.stat()
+    key = (str(mesh_path.absolute()).lower(), stat.st_size, stat.st_mtime_ns)
+    with _MESH_CACHE_LOCK:
+        cached = _MESH_CACHE.get(key)
+        if cached is not None:
+            _MESH_CACHE.move_to_end(key)
+            count("msh.cache_hits")
+            return cached[0]
+    count("msh.cache_misses")
+    count("msh.bytes_read", stat.st_size)
+    with timed("msh.parse", path=str(mesh_path)):
+        mesh = Msh.from_file(mesh_path)
+    size = _msh_size(mesh)
+    with _MESH_CACHE_LOCK:
+        if key not in _MESH_CACHE:
+            _MESH_CACHE[key] = mesh, size
+            _mesh_cache_size += size
+            _trim_mesh_cache()
+    return mesh
+
+
+def resolve_msh_path(game_root: Path, mesh_path: Path, record_miss: bool = True):
+    if (game_root / mesh_path).exists():
+        return game_root / mesh_path
+    return find_file_v2(game_root, mesh_path, record_miss)
 
 
 def _create_skeleton(model_name: str, skeleton: Skeleton, game: Game):
@@ -41,15 +109,77 @@ def _create_skeleton(model_name: str, skeleton: Skeleton, game: Game):
     return arm_obj
 
 
+def _assign_weights(weight_groups: list[bpy.types.VertexGroup], weights: np.ndarray):
+    weights = weights[weights["weight"] > 0]
+    if len(weights) == 0:
+        return
+    weights = weights[np.lexsort((weights["weight"], weights["bone_id"]))]
+    bone_ids = weights["bone_id"]
+    values = weights["weight"]
+    vertex_ids = weights["vtx_id"]
+    # One add() call per run of equal (bone, weight) pairs
+    run_starts = np.flatnonzero((bone_ids[1:] != bone_ids[:-1]) | (values[1:] != values[:-1])) + 1
+    run_starts = np.concatenate(([0], run_starts))
+    run_ends = np.concatenate((run_starts[1:], [len(weights)]))
+    for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+        weight_groups[bone_ids[start]].add(vertex_ids[start:end].tolist(), float(values[start]), 'REPLACE')
+
+
+def _fill_mesh_data(game_root: Path, mesh_data: bpy.types.Mesh, mesh_obj: bpy.types.Object, submesh: SubMesh,
+                    game: Game):
+    mesh_data.from_pydata(submesh.position_data, [], submesh.lod_indices(0)[:, ::-1])
+    mesh_data.update(calc_edges=True, calc_edges_loose=True)
+
+    material = create_material(submesh.material.stem, mesh_obj)
+    if submesh.material.name != "":
+        generate_material_nodes(game_root, submesh.material, material, mesh_obj, game)
+
+    vertex_indices = np.zeros((len(mesh_data.loops, )), dtype=np.uint32)
+    mesh_data.loops.foreach_get('vertex_index', vertex_indices)
+
+    mesh_data.polygons.foreach_set("use_smooth", np.ones(len(mesh_data.polygons), np.uint32))
+    if not is_blender_4_1():
+        mesh_data.use_auto_smooth = True
+    if submesh.normal_data is not None:
+        normals = submesh.normal_data.copy()
+        mesh_data.normals_split_custom_set_from_vertices(normals)
+
+    for i in range(5):
+        if submesh.uv_data(i) is not None:
+            uv_layer = mesh_data.uv_layers.new(name=f"UV{i}")
+            uv_data = submesh.uv_data(i).copy()
+
+            uv_data[:, 1] = 1 - uv_data[:, 1]
+
+            uv_layer.data.foreach_set('uv', uv_data[vertex_indices].ravel())
+    # if submesh.uv1_tangent_data() is not None:
+    #     assert "UV1" not in mesh_data.uv_layers
+    #     uv_layer = mesh_data.uv_layers.new(name=f"UV1")
+    #     uv_data = submesh.uv1_tangent_data()[:, :2].copy()
+    #     uv_data[:, 1] = 1 - uv_data[:, 1]
+    #
+    #     uv_layer.data.foreach_set('uv', uv_data[vertex_indices].ravel())
+    #
+    #     uv_layer = mesh_data.uv_layers.new(name=f"UV1_2")
+    #     uv_data = submesh.uv1_tangent_data()[:, 2:].copy()
+    #
+    #     uv_data[:, 1] = 1 - uv_data[:, 1]
+    #
+    #     uv_layer.data.foreach_set('uv', uv_data[vertex_indices].ravel())
+    for i in range(2):
+        if submesh.color_data(i) is not None:
+            vertex_colors = mesh_data.vertex_colors.new(name=f"COL{i}")
+            vertex_colors_data = vertex_colors.data
+            colors = submesh.color_data(i)[vertex_indices]
+            vertex_colors_data.foreach_set("color", colors.ravel())
+
+
+@profiled("msh.build")
 def load_msh(game_root: Path, mesh_path: Path, parent_collection: bpy.types.Collection, game: Game):
-    if (game_root / mesh_path).exists():
-        resolved_mesh_path = game_root / mesh_path
-    else:
-        resolved_mesh_path = find_file_v2(game_root, mesh_path)
+    resolved_mesh_path = resolve_msh_path(game_root, mesh_path)
     if resolved_mesh_path is None:
         print(f"Failed to find file {mesh_path} in {game_root}")
-    with FileBuffer(resolved_mesh_path) as f:
-        mesh = Msh.from_buffer(f)
+    mesh = read_msh(resolved_mesh_path)
     parent = bpy.data.objects.new(mesh_path.stem, None)
     if mesh.skeleton:
         skeleton = _create_skeleton(mesh_path.stem, mesh.skeleton, game)
@@ -59,70 +189,33 @@ def load_msh(game_root: Path, mesh_path: Path, parent_collection: bpy.types.Coll
         skeleton = None
     all_objects = {}
     submeshes = []
-    for submesh in mesh.submeshes:
+    for submesh_id, submesh in enumerate(mesh.submeshes):
         if "_collider" in submesh.name:
             continue
-        mesh_data = bpy.data.meshes.new(submesh.name + f"_MESH")
+        # Keyed by game as well: the materials a mesh is built with come from that game's node graphs
+        mesh_source = f"{game.value}:{str(resolved_mesh_path).lower()}:{submesh_id}"
+        mesh_data = bpy.data.meshes.get(_MESH_DATA_REGISTRY.get(mesh_source, ""))
+        is_new_data = mesh_data is None or mesh_data.get("hpl_source") != mesh_source
+        if is_new_data:
+            mesh_data = bpy.data.meshes.new(submesh.name + f"_MESH")
+            mesh_data["hpl_source"] = mesh_source
+            _MESH_DATA_REGISTRY[mesh_source] = mesh_data.name
         mesh_obj = bpy.data.objects.new(submesh.name, mesh_data)
         all_objects[submesh.name] = mesh_obj.name
         submeshes.append(mesh_obj.name)
 
-        mesh_data.from_pydata(submesh.position_data, [], submesh.lod_indices(0)[:, ::-1])
-        mesh_data.update(calc_edges=True, calc_edges_loose=True)
-
-        material = create_material(submesh.material.stem, mesh_obj)
-        if submesh.material.name != "":
-            generate_material_nodes(game_root, submesh.material, material, mesh_obj, game)
-
-        vertex_indices = np.zeros((len(mesh_data.loops, )), dtype=np.uint32)
-        mesh_data.loops.foreach_get('vertex_index', vertex_indices)
-
-        mesh_data.polygons.foreach_set("use_smooth", np.ones(len(mesh_data.polygons), np.uint32))
-        if not is_blender_4_1():
-            mesh_data.use_auto_smooth = True
-        if submesh.normal_data is not None:
-            normals = submesh.normal_data.copy()
-            mesh_data.normals_split_custom_set_from_vertices(normals)
-
-        for i in range(5):
-            if submesh.uv_data(i) is not None:
-                uv_layer = mesh_data.uv_layers.new(name=f"UV{i}")
-                uv_data = submesh.uv_data(i).copy()
-
-                uv_data[:, 1] = 1 - uv_data[:, 1]
-
-                uv_layer.data.foreach_set('uv', uv_data[vertex_indices].ravel())
-        # if submesh.uv1_tangent_data() is not None:
-        #     assert "UV1" not in mesh_data.uv_layers
-        #     uv_layer = mesh_data.uv_layers.new(name=f"UV1")
-        #     uv_data = submesh.uv1_tangent_data()[:, :2].copy()
-        #     uv_data[:, 1] = 1 - uv_data[:, 1]
-        #
-        #     uv_layer.data.foreach_set('uv', uv_data[vertex_indices].ravel())
-        #
-        #     uv_layer = mesh_data.uv_layers.new(name=f"UV1_2")
-        #     uv_data = submesh.uv1_tangent_data()[:, 2:].copy()
-        #
-        #     uv_data[:, 1] = 1 - uv_data[:, 1]
-        #
-        #     uv_layer.data.foreach_set('uv', uv_data[vertex_indices].ravel())
-        for i in range(2):
-            if submesh.color_data(i) is not None:
-                vertex_colors = mesh_data.vertex_colors.new(name=f"COL{i}")
-                vertex_colors_data = vertex_colors.data
-                colors = submesh.color_data(i)[vertex_indices]
-                vertex_colors_data.foreach_set("color", colors.ravel())
+        if is_new_data:
+            _fill_mesh_data(game_root, mesh_data, mesh_obj, submesh, game)
 
         if skeleton is not None:
             all_bones = []
             for root in mesh.skeleton.bones:
                 all_bones.append((root, None))
                 all_bones.extend(root.flatten())
-            weight_groups = {bone[0].name: mesh_obj.vertex_groups.new(name=bone[0].name) for bone in all_bones}
-            for vertex, bone_index, weight, in submesh.weights:
-                if weight > 0:
-                    bone_name = all_bones[bone_index][0].name
-                    weight_groups[bone_name].add([int(vertex)], weight, 'REPLACE')
+            weight_groups = [mesh_obj.vertex_groups.get(bone.name) or mesh_obj.vertex_groups.new(name=bone.name)
+                             for bone, _ in all_bones]
+            if is_new_data:
+                _assign_weights(weight_groups, submesh.weights)
             modifier = mesh_obj.modifiers.new(type="ARMATURE", name="Armature")
             modifier.object = skeleton
         mesh_obj.parent = parent
@@ -0,0 +1,85 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .common_utils import find_file_v2
+from .ent_loader import read_ent
+from .game import Game
+from .mat_loader import read_mat
+from .msh_loader import read_msh, resolve_msh_path
+from .profiling import profiled
+
+# Parsing stage of map imports. Meshes, entity files and materials are resolved and parsed on worker threads
+# into the msh/ent/mat caches, the bpy build that follows on the main thread then only hits those caches.
+# Threads rather than processes: parsed objects would have to be pickled back and Blender's bundled
+# interpreter does not spawn worker processes reliably.
+
+# One pool for the whole session, so prefetching a map and its sections doesn't spin up threads every call
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _prefetch_mat(game_root: Path, material_path: Path, resolved_materials: list[Path]):
+    resolved = find_file_v2(game_root, material_path, record_miss=False)
+    if resolved is not None and resolved.is_file():
+        read_mat(resolved)
+        resolved_materials.append(resolved)
+    return []
+
+
+def _prefetch_msh(game_root: Path, mesh_path: Path):
+    resolved = resolve_msh_path(game_root, mesh_path, record_miss=False)
+    if resolved is None:
+        return []
+    mesh = read_msh(resolved)
+    return [submesh.material for submesh in mesh.submeshes if submesh.material.name != ""]
+
+
+def _prefetch_ent(game_root: Path, ent_path: Path, game: Game):
+    entity_data = read_ent(ent_path, game)
+    return _prefetch_msh(game_root, entity_data.model_data.mesh.filename.with_suffix(".msh"))
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(thread_name_prefix="prefetch")
+        return _EXECUTOR
+
+
+def _safe(fn, *args):
+    try:
+        return fn(*args)
+    except Exception:
+        # Reported by the main thread when the build stage loads the same file
+        return []
+
+
+@profiled("prefetch")
+def prefetch_assets(game_root: Path, game: Game, meshes: Iterable[Path] = (), entities: Iterable[Path] = (),
+                    materials: Iterable[Path] = ()):
+    # Returns the resolved paths of every .mat that was parsed
+    pool = _executor()
+    seen_materials = set()
+    resolved_materials = []
+    pending = set()
+
+    def _submit_materials(material_paths):
+        for material_path in material_paths:
+            key = str(material_path).lower()
+            if key not in seen_materials:
+                seen_materials.add(key)
+                pending.add(pool.submit(_safe, _prefetch_mat, game_root, material_path, resolved_materials))
+
+    for mesh_path in {path for path in meshes if path.exists()}:
+        pending.add(pool.submit(_safe, _prefetch_msh, game_root, mesh_path))
+    for ent_path in {path for path in entities if path.exists()}:
+        pending.add(pool.submit(_safe, _prefetch_ent, game_root, ent_path, game))
+    _submit_materials(materials)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            _submit_materials(future.result())
+    return resolved_materials
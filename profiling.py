@@ -0,0 +1,127 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass(slots=True)
+class StageStats:
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+@dataclass
+class ImportProfile:
+    name: str
+    start: float = field(default_factory=time.perf_counter)
+    events: list[dict] = field(default_factory=list)
+    counters: Counter = field(default_factory=Counter)
+    stages: dict[str, StageStats] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_event(self, stage: str, start: float, elapsed: float, args: dict):
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.calls += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            self.events.append({"name": stage, "cat": stage.split(".", 1)[0], "ph": "X",
+                                "ts": (start - self.start) * 1e6, "dur": elapsed * 1e6,
+                                "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+
+    def add_count(self, counter: str, amount: int):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def as_trace(self):
+        # Chrome trace format, opens in chrome://tracing and Perfetto
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "name": self.name,
+                "elapsed": time.perf_counter() - self.start,
+                "counters": dict(self.counters),
+                "stages": {stage: {"calls": stats.calls, "total": stats.total, "max": stats.max}
+                           for stage, stats in self.stages.items()},
+            },
+        }
+
+
+_PROFILE: Optional[ImportProfile] = None
+
+
+def begin_profile(name: str):
+    global _PROFILE
+    _PROFILE = ImportProfile(name)
+    return _PROFILE
+
+
+def end_profile(output_dir: Optional[Path] = None):
+    global _PROFILE
+    profile, _PROFILE = _PROFILE, None
+    if profile is None:
+        return None
+    trace = profile.as_trace()
+    print(f"Import profile for {profile.name}: {trace['otherData']['elapsed']:.3f}s")
+    for stage, stats in sorted(profile.stages.items(), key=lambda item: -item[1].total):
+        print(f"\t{stage}: {stats.calls} calls, {stats.total:.3f}s total, {stats.max * 1000:.2f}ms max")
+    for counter, value in sorted(profile.counters.items()):
+        print(f"\t{counter}: {value}")
+    if output_dir is None:
+        return None
+    output_dir.mkdir(parents=True, exist_ok=True)
+    report_path = output_dir / f"{Path(profile.name).stem}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    try:
+        with report_path.open("w", encoding="utf8") as f:
+            json.dump(trace, f)
+    except OSError as ex:
+        print(f"Failed to save import profile to {report_path}: {ex}")
+        return None
+    print(f"Saved import profile to {report_path}")
+    return report_path
+
+
+def count(counter: str, amount: int = 1):
+    if _PROFILE is not None:
+        _PROFILE.add_count(counter, amount)
+
+
+@contextmanager
+def timed(stage: str, **args):
+    profile = _PROFILE
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_event(stage, start, time.perf_counter() - start, args)
+
+
+def profiled(stage: str):
+    def _decorator(fn):
+        @functools.wraps(fn)
+        def _wrapper(*args, **kwargs):
+            profile = _PROFILE
+            if profile is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.add_event(stage, start, time.perf_counter() - start, {})
+
+        return _wrapper
+
+    return _decorator
@@ -0,0 +1,118 @@
+import typing
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from UniLoader.common_api.xml_parsing import XmlAutoDeserialize, XAttr, XChild, parse_bool
+
+_PLAIN_CONVERTERS = {
+    int: int,
+    float: float,
+    str: None,
+    Path: Path,
+    bool: parse_bool,
+}
+
+_DECODERS: dict[type, Optional[Callable[[Any], Any]]] = {}
+
+
+class UnsupportedField(Exception):
+    # A field compiled decoders can't express, the class is decoded by the generic XmlAutoDeserialize path
+    pass
+
+
+def _collect_fields(cls: type):
+    fields = {}
+    annotations = {}
+    for klass in reversed(cls.__mro__):
+        annotations.update(vars(klass).get("__annotations__", {}))
+        for name, value in vars(klass).items():
+            if isinstance(value, (XAttr, XChild)):
+                fields[name] = value
+    return fields, annotations
+
+
+def _attr_converter(field: XAttr, annotation):
+    converter = field.deserializer
+    if converter is None:
+        if annotation not in _PLAIN_CONVERTERS:
+            raise UnsupportedField(f"no converter for {annotation}")
+        converter = _PLAIN_CONVERTERS[annotation]
+    return converter
+
+
+def attr_converter(cls: type, name: str):
+    # (attribute name, converter or None, default) of an XAttr field, applied the same way as in compiled decoders
+    fields, annotations = _collect_fields(cls)
+    field = fields[name]
+    return field.name, _attr_converter(field, annotations.get(name)), field.default
+
+
+def _attr_lines(index: int, name: str, field: XAttr, annotation, env: dict):
+    converter = _attr_converter(field, annotation)
+    env[f"default_{index}"] = field.default
+    env[f"convert_{index}"] = converter
+    lines = [f"    v = get({field.name!r})"]
+    for alias in field.aliases or ():
+        lines.append(f"    if v is None: v = get({alias!r})")
+    value = f"convert_{index}(v)" if converter is not None else "v"
+    lines.append(f"    obj.{name} = default_{index} if v is None else {value}")
+    return lines
+
+
+def _child_lines(index: int, name: str, field: XChild, annotation, env: dict):
+    is_list = typing.get_origin(annotation) is list and not field.ignore_array
+    item_type = typing.get_args(annotation)[0] if is_list else annotation
+    converter = field.deserializer
+    if converter is None:
+        if not (isinstance(item_type, type) and issubclass(item_type, XmlAutoDeserialize)):
+            raise UnsupportedField(f"no converter for {annotation}")
+        converter = item_type.from_xml
+    if not isinstance(field.name, str):
+        raise UnsupportedField("children with multiple aliases are decoded generically")
+    env[f"default_{index}"] = field.default
+    env[f"convert_{index}"] = converter
+    if is_list:
+        return [f"    obj.{name} = [convert_{index}(c) for c in element.iterfind({field.name!r})]"]
+    if field.deserializer is not None:
+        return [f"    obj.{name} = convert_{index}(element.find({field.name!r}))"]
+    return [f"    c = element.find({field.name!r})",
+            f"    obj.{name} = default_{index} if c is None else convert_{index}(c)"]
+
+
+def compile_decoder(cls: type) -> Optional[Callable[[Any], Any]]:
+    # Generates `decode(element)` with every field lookup and conversion unrolled, or None when a field
+    # can't be expressed this way and the generic XmlAutoDeserialize path has to be used instead.
+    # Anything other than UnsupportedField (e.g. XAttr/XChild not looking as expected) is a bug and propagates.
+    fields, annotations = _collect_fields(cls)
+    if not fields:
+        return None
+    env = {"new": object.__new__, "cls": cls}
+    lines = ["def decode(element):",
+             "    get = element.attrib.get",
+             "    obj = new(cls)"]
+    try:
+        for index, (name, field) in enumerate(fields.items()):
+            if isinstance(field, XAttr):
+                lines.extend(_attr_lines(index, name, field, annotations.get(name), env))
+            else:
+                lines.extend(_child_lines(index, name, field, annotations.get(name), env))
+    except UnsupportedField as ex:
+        print(f"Using generic XML decoding for {cls.__name__}: {name}: {ex}")
+        return None
+    lines.append("    return obj")
+    exec("\n".join(lines), env)
+    return env["decode"]
+
+
+class CompiledXmlDeserialize(XmlAutoDeserialize):
+
+    @classmethod
+    def from_xml(cls, element):
+        if element is None:
+            return super().from_xml(element)
+        if cls not in _DECODERS:
+            _DECODERS[cls] = compile_decoder(cls)
+        decoder = _DECODERS[cls]
+        if decoder is None:
+            return super().from_xml(element)
+        return decoder(element)
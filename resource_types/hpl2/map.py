@@ -4,8 +4,9 @@ from xml.etree.ElementTree import Element
 
 from UniLoader.common_api.xml_parsing import XmlAutoDeserialize, XChild, XAttr, parse_float_list, parse_bool, \
     parse_user_variables
+from ..compiled_xml import CompiledXmlDeserialize
 from ..hpl2.common import EditorSession
-from ..hpl_common.map import PlaneCommon, DecalCommon, File, StaticObjectCommon, EntityCommon
+from ..hpl_common.map import PlaneCommon, DecalCommon, File, StaticObjectCommon, EntityCommon, StaticObjectColumns
 
 
 class FileList(XmlAutoDeserialize):
@@ -16,6 +17,8 @@ class StaticObject(StaticObjectCommon):
     group: int = XAttr("Group")
     tag: str = XAttr("Tag")
 
+    row_fields = {**StaticObjectCommon.row_fields, "group": "group", "tag": "tag"}
+
     def as_dict(self):
         d = super().as_dict()
         d.update({
@@ -25,10 +28,6 @@ class StaticObject(StaticObjectCommon):
         return d
 
 
-class StaticObjects(XmlAutoDeserialize):
-    objects: list[StaticObject] = XChild("StaticObject")
-
-
 class Plane(PlaneCommon):
     group: int = XAttr("Group")
     tag: str = XAttr("Tag")
@@ -61,7 +60,7 @@ class Entity(EntityCommon):
     tag: str = XAttr("Tag")
 
 
-class Light(XmlAutoDeserialize):
+class Light(CompiledXmlDeserialize):
     id: int = XAttr("ID")
     group: int = XAttr("Group")
     name: str = XAttr("Name")
@@ -205,11 +204,34 @@ class Area(XmlAutoDeserialize):
     user_variables: dict[str, str] = XChild("UserVariables", deserializer=parse_user_variables)
 
 
+_MAP_RECORD_TYPES = {
+    "StaticObject": StaticObject,
+    "Plane": Plane,
+    "Decal": Decal,
+    "Entity": Entity,
+    "Area": Area,
+    "PointLight": PointLight,
+    "SpotLight": SpotLight,
+    "BoxLight": BoxLight,
+}
+
+MAP_RECORD_CONTAINERS = {"StaticObjects", "Primitives", "Decals", "Entities"}
+
+
+def parse_map_record(element: Element):
+    record_type = _MAP_RECORD_TYPES.get(element.tag)
+    if record_type is None:
+        return None
+    return record_type.from_xml(element)
+
+
 class MapContents(XmlAutoDeserialize):
     file_index_static_objects: FileList = XChild("FileIndex_StaticObjects")
     file_index_entities: FileList = XChild("FileIndex_Entities")
     file_index_decals: FileList = XChild("FileIndex_Decals")
-    static_objects: StaticObjects = XChild("StaticObjects")
+    static_objects: StaticObjectColumns = XChild("StaticObjects",
+                                                 deserializer=lambda v: StaticObjectColumns.from_elements(StaticObject,
+                                                                                                          v))
     primitives: Primitives = XChild("Primitives")
     decals: Decals = XChild("Decals")
     entities: list[Union[Entity, Light, Area]] = XChild.with_multiple_aliases("Entities",
@@ -13,7 +13,7 @@ from ..hpl2.map import PointLight as PointLightHPL2
 from ..hpl2.map import SpotLight as SpotLightHPL2
 from ..hpl2.map import BoxLight as BoxLightHPL2
 from ..hpl_common.map import PlaneCommon, ObjectCommon, DecalCommon, StaticObjectCommon, \
-    EntityCommon
+    EntityCommon, StaticObjectColumns
 
 
 def _parse_array(o_type: Type[XmlAutoDeserialize]):
@@ -61,10 +61,34 @@ class Area(_Object):
     mesh: Path = XAttr("Mesh")
     user_variables: dict[str, Any] = XChild("UserVariables", deserializer=parse_user_variables)
 
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "uid": self.uid,
+            "name": self.name,
+            "active": self.active,
+            "area_type": self.area_type,
+            "mesh": str(self.mesh) if self.mesh is not None else "",
+            "user_variables": self.user_variables or {},
+            "created": str(self.creation),
+            "modified": str(self.modification),
+        }
+
 
 class Compound(_Object):
     components: list[int] = XChild("Component", deserializer=lambda v: int(v.get("ID")))
 
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "uid": self.uid,
+            "name": self.name,
+            "active": self.active,
+            "components": self.components,
+            "created": str(self.creation),
+            "modified": str(self.modification),
+        }
+
 
 class Decal(DecalCommon, _Object):
     culled_by_distance: bool = XAttr("CulledByDistance", deserializer=parse_bool)
@@ -97,6 +121,11 @@ class StaticObject(StaticObjectCommon, _Object):
     culled_by_distance: bool = XAttr("CulledByDistance", deserializer=parse_bool)
     culled_by_fog: bool = XAttr("CulledByFog", deserializer=parse_bool)
 
+    row_fields = {**StaticObjectCommon.row_fields, "is_occluder": "is_occluder", "color_mul": "color_mul",
+                  "illum_color": "illum_color", "illum_brightness": "illum_brightness",
+                  "culled_by_distance": "culled_by_distance", "culled_by_fog": "culled_by_fog",
+                  "created": "creation", "modified": "modification"}
+
     def as_dict(self):
         d = super().as_dict()
         d.update({
@@ -106,6 +135,8 @@ class StaticObject(StaticObjectCommon, _Object):
             "illum_brightness": self.illum_brightness,
             "culled_by_distance": self.culled_by_distance,
             "culled_by_fog": self.culled_by_fog,
+            "created": str(self.creation),
+            "modified": str(self.modification),
         })
         return d
 
@@ -193,7 +224,9 @@ class Section(XmlAutoDeserialize):
 
 class StaticObjectSection(Section):
     files: list[File] = XChild("FileIndex_StaticObjects", deserializer=_parse_array(File), ignore_array=True)
-    objects: list[StaticObject] = XChild("Objects", deserializer=_parse_array(StaticObject), ignore_array=True)
+    objects: StaticObjectColumns = XChild("Objects",
+                                          deserializer=lambda v: StaticObjectColumns.from_elements(StaticObject, v),
+                                          ignore_array=True)
 
 
 class EntitySection(Section):
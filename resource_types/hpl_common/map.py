@@ -1,12 +1,19 @@
+import datetime
+import sys
+from dataclasses import dataclass, field
+from functools import cached_property
 from pathlib import Path
+from typing import Any, Iterable, Optional
+from xml.etree.ElementTree import Element
 
 import numpy as np
 
 from UniLoader.common_api.xml_parsing import XmlAutoDeserialize, XAttr, parse_bool, parse_float_list, XChild, \
-    parse_np_vec4, parse_np_vec3, parse_np_ivec3, parse_user_variables
+    parse_user_variables
+from ..compiled_xml import CompiledXmlDeserialize, attr_converter
 
 
-class ObjectCommon(XmlAutoDeserialize):
+class ObjectCommon(CompiledXmlDeserialize):
     id: int = XAttr("ID")
     position: list[float] = XAttr("WorldPos", deserializer=parse_float_list)
     rotation: list[float] = XAttr("Rotation", deserializer=parse_float_list)
@@ -43,12 +50,43 @@ class PlaneCommon(ObjectCommon):
         }
 
 
+def _array_text(element):
+    return element.get("Array") if element is not None else None
+
+
+def _decode_array(text: Optional[str], dtype: type, width: int) -> Optional[np.ndarray]:
+    if text is None:
+        return None
+    return np.fromstring(text, dtype=dtype, sep=" ").reshape((-1, width))
+
+
 class DecalMesh(XmlAutoDeserialize):
-    positions: np.ndarray = XChild("Positions", deserializer=lambda v: parse_np_vec4(v.get("Array")) if v is not None else None)
-    normals: np.ndarray = XChild("Normals", deserializer=lambda v: parse_np_vec3(v.get("Array")) if v is not None else None)
-    tangents: np.ndarray = XChild("Tangents", deserializer=lambda v: parse_np_vec4(v.get("Array")) if v is not None else None)
-    tex_coords: np.ndarray = XChild("TexCoords", deserializer=lambda v: parse_np_vec3(v.get("Array")) if v is not None else None)
-    indices: np.ndarray = XChild("Indices", deserializer=lambda v: parse_np_ivec3(v.get("Array")) if v is not None else None)
+    # Arrays are kept as attribute text and decoded on first access, so skipped decals are never decoded
+    positions_array: Optional[str] = XChild("Positions", deserializer=_array_text)
+    normals_array: Optional[str] = XChild("Normals", deserializer=_array_text)
+    tangents_array: Optional[str] = XChild("Tangents", deserializer=_array_text)
+    tex_coords_array: Optional[str] = XChild("TexCoords", deserializer=_array_text)
+    indices_array: Optional[str] = XChild("Indices", deserializer=_array_text)
+
+    @cached_property
+    def positions(self) -> Optional[np.ndarray]:
+        return _decode_array(self.positions_array, np.float32, 4)
+
+    @cached_property
+    def normals(self) -> Optional[np.ndarray]:
+        return _decode_array(self.normals_array, np.float32, 3)
+
+    @cached_property
+    def tangents(self) -> Optional[np.ndarray]:
+        return _decode_array(self.tangents_array, np.float32, 4)
+
+    @cached_property
+    def tex_coords(self) -> Optional[np.ndarray]:
+        return _decode_array(self.tex_coords_array, np.float32, 3)
+
+    @cached_property
+    def indices(self) -> Optional[np.ndarray]:
+        return _decode_array(self.indices_array, np.uint32, 3)
 
 
 class DecalCommon(ObjectCommon):
@@ -66,6 +104,9 @@ class DecalCommon(ObjectCommon):
 
     mesh: DecalMesh = XChild("DecalMesh")
 
+    def is_buildable(self):
+        return self.active and self.mesh is not None and self.mesh.positions_array is not None
+
     def as_dict(self):
         return {
             "id": self.id,
@@ -92,6 +133,9 @@ class StaticObjectCommon(ObjectCommon):
     cast_shadows: bool = XAttr("CastShadows", deserializer=parse_bool)
     file_index: int = XAttr("FileIndex")
 
+    # as_dict keys outside the placement columns -> field, the only per-row data StaticObjectColumns keeps
+    row_fields = {"cast_shadows": "cast_shadows", "collides": "collides"}
+
     def as_dict(self):
         return {
             "id": self.id,
@@ -105,6 +149,109 @@ class StaticObjectCommon(ObjectCommon):
         }
 
 
+def _row_value(value):
+    # Row values end up in ID properties, which only take plain types
+    if isinstance(value, datetime.datetime):
+        return str(value)
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _decode_row(text: str, width: int, default: tuple[float, ...]) -> tuple[float, ...]:
+    try:
+        values = tuple(float(value) for value in text.split())
+    except ValueError:
+        return default
+    return values if len(values) == width else default
+
+
+def _decode_rows(texts: list[str], dtype: type, width: int, default: tuple[float, ...]) -> np.ndarray:
+    # Bulk decode when every row has exactly width components, a malformed row would shift all rows after it,
+    # so those sections are decoded row by row with the malformed rows replaced by default
+    if not texts:
+        return np.empty((0, width), dtype)
+    if all(len(text.split()) == width for text in texts):
+        try:
+            values = _decode_array(" ".join(texts), dtype, width)
+        except ValueError:
+            values = None
+        # Older numpy stops at the first non-number instead of raising
+        if values is not None and len(values) == len(texts):
+            return values
+    rows = [_decode_row(text, width, default) for text in texts]
+    malformed = sum(row is default for row in rows)
+    print(f"Replaced {malformed} malformed placement values with {default}")
+    return np.asarray(rows, dtype)
+
+
+@dataclass(slots=True)
+class StaticObjectColumns:
+    # Struct-of-arrays form of a list of StaticObjectCommon placements. Scale is already clamped.
+    ids: np.ndarray
+    names: list[str]
+    file_index: np.ndarray
+    position: np.ndarray
+    rotation: np.ndarray
+    scale: np.ndarray
+    extra: dict[str, list[Any]] = field(default_factory=dict)
+
+    @classmethod
+    def from_elements(cls, record_type: type, elements: Optional[Iterable[Element]]):
+        # Fills the columns straight from StaticObject elements, no per-row record objects are created.
+        # Placement attributes stay text until they are decoded in bulk, other fields are limited to
+        # record_type.row_fields and go through the same converters as record_type.from_xml.
+        row_fields = [(key, *attr_converter(record_type, name)) for key, name in record_type.row_fields.items()]
+        ids = []
+        names = []
+        file_index = []
+        position = []
+        rotation = []
+        scale = []
+        extra = {key: [] for key, *_ in row_fields}
+        for element in elements if elements is not None else ():
+            get = element.attrib.get
+            try:
+                row_id = int(get("ID"))
+                row_file_index = int(get("FileIndex"))
+            except (TypeError, ValueError):
+                print(f"Skipping {element.tag} {get('Name', '')!r} without a valid ID/FileIndex")
+                continue
+            ids.append(row_id)
+            names.append(sys.intern(get("Name", "")))
+            file_index.append(row_file_index)
+            position.append(get("WorldPos", "0 0 0"))
+            rotation.append(get("Rotation", "0 0 0"))
+            scale.append(get("Scale", "1 1 1"))
+            for key, attribute, converter, default in row_fields:
+                value = get(attribute)
+                if value is None:
+                    extra[key].append(default)
+                else:
+                    extra[key].append(_row_value(converter(value) if converter is not None else value))
+        return cls(np.asarray(ids, np.int64),
+                   names,
+                   np.asarray(file_index, np.int32),
+                   _decode_rows(position, np.float32, 3, (0.0, 0.0, 0.0)),
+                   _decode_rows(rotation, np.float32, 3, (0.0, 0.0, 0.0)),
+                   np.maximum(_decode_rows(scale, np.float32, 3, (1.0, 1.0, 1.0)), 0.01),
+                   extra)
+
+    def __len__(self):
+        return len(self.names)
+
+    def row_dict(self, index: int):
+        row = {
+            "id": int(self.ids[index]),
+            "file_index": int(self.file_index[index]),
+            "name": self.names[index],
+            "rotation": self.rotation[index].tolist(),
+            "scale": self.scale[index].tolist(),
+            "position": self.position[index].tolist(),
+        }
+        for key, values in self.extra.items():
+            row[key] = values[index]
+        return row
+
+
 class EntityCommon(ObjectCommon):
     name: str = XAttr("Name")
     file_index: int = XAttr("FileIndex")
@@ -112,6 +259,6 @@ class EntityCommon(ObjectCommon):
     user_variables: dict[str, str] = XChild("UserVariables", deserializer=parse_user_variables)
 
 
-class File(XmlAutoDeserialize):
+class File(CompiledXmlDeserialize):
     id: int = XAttr("Id")
     path: Path = XAttr("Path")
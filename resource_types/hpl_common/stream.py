@@ -0,0 +1,42 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+from xml.etree.ElementTree import Element
+
+from .map import File
+from ..xml_backend import iterparse
+
+
+@dataclass(slots=True)
+class StreamSection:
+    name: Optional[str]
+    files: list[File] = field(default_factory=list)
+    file_indices: dict[str, list[File]] = field(default_factory=dict)
+
+
+def iter_map_records(path: Path, record_parser: Callable[[Element], Any], containers: set[str],
+                     section_tag: str = "Section") -> Iterator[tuple[StreamSection, str, Any]]:
+    # Yields (section, container tag, record) for every element directly inside one of the containers.
+    # Finished elements are detached from their parents, so only the open path of the tree stays in memory.
+    section = StreamSection(None)
+    stack = []
+    for event, element in iterparse(path, events=("start", "end")):
+        if event == "start":
+            if element.tag == section_tag:
+                section = StreamSection(element.get("Name"))
+            stack.append(element)
+            continue
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if element.tag.startswith("FileIndex_"):
+            files = [File.from_xml(item) for item in element]
+            section.file_indices[element.tag] = files
+            if len(section.file_indices) == 1:
+                section.files = files
+        elif parent is not None and parent.tag in containers:
+            record = record_parser(element)
+            if record is not None:
+                yield section, parent.tag, record
+        else:
+            continue
+        parent.remove(element)
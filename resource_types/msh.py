@@ -1,15 +1,33 @@
+import io
+import mmap
 from dataclasses import dataclass, field
 from enum import IntEnum
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 
-from UniLoader.common_api import Vector3
+from UniLoader.common_api import Vector3, FileBuffer
 from UniLoader.common_api.buffer_api import Buffer
 from UniLoader.common_api.xml_parsing import *
 
 
+def _read_array(buffer: Buffer, mapped: Optional[mmap.mmap], dtype: np.dtype, count: int) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    if mapped is None:
+        return np.frombuffer(buffer.read(count * dtype.itemsize), dtype)
+    offset = buffer.tell()
+    buffer.seek(count * dtype.itemsize, io.SEEK_CUR)
+    return np.frombuffer(mapped, dtype, count, offset)
+
+
+def _read_indices(buffer: Buffer, mapped: Optional[mmap.mmap], index_count: int, header_only: bool):
+    if header_only:
+        buffer.seek(index_count * 4, io.SEEK_CUR)
+        return None
+    return _read_array(buffer, mapped, np.uint32, index_count).reshape((-1, 3))
+
+
 @dataclass(slots=True)
 class Bone:
     name: str
@@ -125,6 +143,30 @@ class VertexBufferElementFormat(IntEnum):
     Byte = 2
 
 
+_FORMAT_DTYPES = {
+    VertexBufferElementFormat.Float: np.dtype(np.float32),
+    VertexBufferElementFormat.Int: np.dtype(np.int32),
+    VertexBufferElementFormat.Byte: np.dtype(np.uint8),
+}
+
+_USAGE_WIDTH = {
+    VertexBufferElement.Normal: 3,
+    VertexBufferElement.Position: 3,
+    VertexBufferElement.Color0: 4,
+    VertexBufferElement.Color1: 4,
+    VertexBufferElement.Texture1Tangent: 4,
+    VertexBufferElement.Texture0: 2,
+    VertexBufferElement.Texture1: 2,
+    VertexBufferElement.Texture2: 2,
+    VertexBufferElement.Texture3: 2,
+    VertexBufferElement.Texture4: 2,
+    VertexBufferElement.User0: 4,
+    VertexBufferElement.User1: 4,
+    VertexBufferElement.User2: 4,
+    VertexBufferElement.User3: 4,
+}
+
+
 @dataclass(slots=True)
 class VtxBufferDesc:
     usage: VertexBufferElement
@@ -138,6 +180,42 @@ class VtxBufferDesc:
         return cls(VertexBufferElement(usage), VertexBufferElementFormat(fmt), unk_2, component_count)
 
 
+@dataclass(slots=True)
+class VertexStream:
+    desc: VtxBufferDesc
+    vertex_count: int
+    offset: int
+    source: Optional[Union[bytes, mmap.mmap]] = None
+    _data: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_buffer(cls, buffer: Buffer, desc: VtxBufferDesc, vertex_count: int, mapped: Optional[mmap.mmap] = None,
+                    header_only: bool = False):
+        stream = cls(desc, vertex_count, buffer.tell())
+        if mapped is not None:
+            stream.source = mapped
+            buffer.seek(stream.size, io.SEEK_CUR)
+        elif header_only:
+            buffer.seek(stream.size, io.SEEK_CUR)
+        else:
+            stream.source = buffer.read(stream.size)
+            stream.offset = 0
+        return stream
+
+    @property
+    def size(self):
+        return self.vertex_count * _FORMAT_DTYPES[self.desc.format].itemsize * self.desc.component_count
+
+    def data(self) -> np.ndarray:
+        if self._data is None:
+            if self.source is None:
+                raise ValueError(f"{self.desc.usage.name} stream was not loaded, mesh was parsed header-only")
+            component_count = self.desc.component_count
+            self._data = np.frombuffer(self.source, _FORMAT_DTYPES[self.desc.format],
+                                       self.vertex_count * component_count, self.offset).reshape((-1, component_count))
+        return self._data
+
+
 @dataclass(slots=True)
 class SubMesh:
     name: str
@@ -149,11 +227,18 @@ class SubMesh:
     colliders: List[Collider] = field(default_factory=list)
     weights: np.ndarray = field(default_factory=list)
     vertex_buffers_desc: List[VtxBufferDesc] = field(default_factory=list)
-    vertex_buffers: List[bytes] = field(default_factory=list)
+    vertex_streams: List[VertexStream] = field(default_factory=list)
     lods: List[Tuple[float, np.ndarray]] = field(default_factory=list)
+    stream_table: dict[VertexBufferElement, VertexStream] = field(init=False)
+
+    def __post_init__(self):
+        self.stream_table = {}
+        for stream in self.vertex_streams:
+            self.stream_table.setdefault(stream.desc.usage, stream)
 
     @classmethod
-    def from_file(cls, buffer: Buffer, version: int = 8):
+    def from_file(cls, buffer: Buffer, version: int = 8, mapped: Optional[mmap.mmap] = None,
+                  header_only: bool = False):
         name = buffer.read_ascii_string()
         material = Path(buffer.read_ascii_string())
         matrix = (buffer.read_fmt("4f"), buffer.read_fmt("4f"), buffer.read_fmt("4f"), buffer.read_fmt("4f"))
@@ -164,18 +249,22 @@ class SubMesh:
         colliders = [Collider.from_buffer(buffer) for _ in range(collider_count)]
 
         vertex_bone_pairs_count = buffer.read_uint32()
-        weights = np.frombuffer(buffer.read(vertex_bone_pairs_count * VertexBonePair.itemsize), dtype=VertexBonePair)
+        if header_only:
+            buffer.seek(vertex_bone_pairs_count * VertexBonePair.itemsize, io.SEEK_CUR)
+            weights = np.zeros(0, VertexBonePair)
+        else:
+            weights = _read_array(buffer, mapped, VertexBonePair, vertex_bone_pairs_count)
 
         vertex_count_count = buffer.read_uint32()
         vertex_buffer_count = buffer.read_uint32()
 
         descs = []
-        buffers = []
+        streams = []
 
         for _ in range(vertex_buffer_count):
             desc = VtxBufferDesc.from_buffer(buffer)
             descs.append(desc)
-            buffers.append(buffer.read(vertex_count_count * 4 * desc.component_count))
+            streams.append(VertexStream.from_buffer(buffer, desc, vertex_count_count, mapped, header_only))
 
         lods = []
         if version == 8:
@@ -183,37 +272,17 @@ class SubMesh:
             for _ in range(lod_count):
                 index_count = buffer.read_uint32()
                 switch_distance = buffer.read_float()
-                indices = np.frombuffer(buffer.read(index_count * 4), np.uint32).reshape((-1, 3))
-                lods.append((switch_distance, indices))
+                lods.append((switch_distance, _read_indices(buffer, mapped, index_count, header_only)))
         else:
             index_count = buffer.read_uint32()
-            indices = np.frombuffer(buffer.read(index_count * 4), np.uint32).reshape((-1, 3))
-            lods.append((0.0, indices))
-        return cls(name, material, matrix, unk_vec, unk, colliders, weights, descs, buffers, lods)
+            lods.append((0.0, _read_indices(buffer, mapped, index_count, header_only)))
+        return cls(name, material, matrix, unk_vec, unk, colliders, weights, descs, streams, lods)
 
     def _get_data(self, usage: VertexBufferElement) -> Optional[np.ndarray]:
-        for desc, buffer in zip(self.vertex_buffers_desc, self.vertex_buffers):
-            if desc.usage == usage and usage == VertexBufferElement.Normal:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :3]
-            elif desc.usage == usage and usage == VertexBufferElement.Position:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :3]
-            elif desc.usage == usage and usage == VertexBufferElement.Color0:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :4]
-            elif desc.usage == usage and usage == VertexBufferElement.Color1:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :4]
-            elif desc.usage == usage and usage == VertexBufferElement.Texture1Tangent:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :4]
-            elif desc.usage == usage and usage == VertexBufferElement.Texture0:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :2]
-            elif desc.usage == usage and usage == VertexBufferElement.Texture1:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :2]
-            elif desc.usage == usage and usage == VertexBufferElement.Texture2:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :2]
-            elif desc.usage == usage and usage == VertexBufferElement.Texture3:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :2]
-            elif desc.usage == usage and usage == VertexBufferElement.Texture4:
-                return np.frombuffer(buffer, np.float32).reshape((-1, desc.component_count))[:, :2]
-        return None
+        stream = self.stream_table.get(usage)
+        if stream is None:
+            return None
+        return stream.data()[:, :_USAGE_WIDTH[usage]]
 
     @property
     def position_data(self) -> Optional[np.ndarray]:
@@ -230,7 +299,11 @@ class SubMesh:
         return self._get_data(VertexBufferElement.Normal)
 
     def color_data(self, layer: int = 0) -> Optional[np.ndarray]:
-        return self._get_data(VertexBufferElement.Color0 + layer)
+        usage = VertexBufferElement(VertexBufferElement.Color0 + layer)
+        colors = self._get_data(usage)
+        if colors is not None and self.stream_table[usage].desc.format == VertexBufferElementFormat.Byte:
+            return colors.astype(np.float32) / 255
+        return colors
 
     def lod_indices(self, lod_id):
         if lod_id > len(self.lods):
@@ -252,7 +325,21 @@ class Msh:
     # animations: List[Animation] = field(default_factory=list)
 
     @classmethod
-    def from_buffer(cls, buffer: Buffer):
+    def from_file(cls, path: Path):
+        # Vertex, weight and index arrays become views into the mapping and are paged in on first access
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with FileBuffer(path) as buffer:
+            return cls.from_buffer(buffer, mapped)
+
+    @classmethod
+    def read_header(cls, path: Path):
+        # Submesh names, materials and stream layouts only, vertex data is skipped
+        with FileBuffer(path) as buffer:
+            return cls.from_buffer(buffer, header_only=True)
+
+    @classmethod
+    def from_buffer(cls, buffer: Buffer, mapped: Optional[mmap.mmap] = None, header_only: bool = False):
         magic = buffer.read_uint32()
         assert magic == 0x76034569, "Invalid magic"
         version = buffer.read_uint32()
@@ -270,7 +357,7 @@ class Msh:
 
         nodes_count = buffer.read_uint32()
         nodes = [Node.from_buffer(buffer) for _ in range(nodes_count)]
-        submeshes = [SubMesh.from_file(buffer, version) for _ in range(submesh_count)]
+        submeshes = [SubMesh.from_file(buffer, version, mapped, header_only) for _ in range(submesh_count)]
         animation_count = buffer.read_uint32()
         if animation_count > 0:
             buffer.read_ascii_string()
@@ -0,0 +1,32 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Iterator, Union
+
+try:
+    from lxml import etree as _lxml
+except ImportError:
+    _lxml = None
+
+if _lxml is not None:
+    XML_BACKEND = "lxml"
+    XmlParseError = (ET.ParseError, _lxml.XMLSyntaxError)
+else:
+    XML_BACKEND = "expat"
+    XmlParseError = (ET.ParseError,)
+
+
+def _lxml_parser():
+    return _lxml.XMLParser(remove_comments=True, remove_pis=True, resolve_entities=False, huge_tree=True)
+
+
+def parse_xml(path: Union[str, Path]):
+    if _lxml is not None:
+        return _lxml.parse(str(path), _lxml_parser()).getroot()
+    return ET.parse(path).getroot()
+
+
+def iterparse(path: Union[str, Path], events: tuple[str, ...] = ("end",)) -> Iterator:
+    if _lxml is not None:
+        return _lxml.iterparse(str(path), events=events, remove_comments=True, remove_pis=True,
+                               resolve_entities=False, huge_tree=True)
+    return ET.iterparse(path, events=events)
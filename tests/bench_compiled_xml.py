@@ -0,0 +1,46 @@
+# Decodes 100k HPL3 StaticObject elements through the generic XmlAutoDeserialize path, the compiled decoder
+# and StaticObjectColumns.from_elements. Needs UniLoader and numpy importable: python tests/bench_compiled_xml.py
+import sys
+import time
+from pathlib import Path
+from xml.etree.ElementTree import fromstring
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from UniLoader.common_api.xml_parsing import XmlAutoDeserialize
+from resource_types.hpl3.map import StaticObject
+from resource_types.hpl_common.map import StaticObjectColumns
+
+OBJECT_COUNT = 100_000
+
+
+def _objects_xml(count: int):
+    rows = "".join(
+        f'<StaticObject ID="{i}" UID="16 {i}" Name="pipe_{i}" Active="true" CreStamp="1390000000" '
+        f'ModStamp="1390000100" WorldPos="{i * 0.5} 1 {-i * 0.25}" Rotation="0 {i % 7 * 0.1} 0" Scale="1 1 1" '
+        f'FileIndex="{i % 16}" Collides="true" CastShadows="true" IsOccluder="false" ColorMul="1 1 1 1" '
+        f'IllumColor="0 0 0 1" IllumBrightness="1" CulledByDistance="true" CulledByFog="true" />'
+        for i in range(count))
+    return f"<Objects>{rows}</Objects>"
+
+
+def _bench(label: str, fn, baseline: float = None):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    speedup = f", {baseline / elapsed:.1f}x" if baseline else ""
+    print(f"{label:<28} {elapsed:.3f}s{speedup}")
+    return elapsed
+
+
+def main():
+    objects = fromstring(_objects_xml(OBJECT_COUNT))
+    generic_from_xml = XmlAutoDeserialize.from_xml.__func__
+    print(f"{OBJECT_COUNT} StaticObject elements")
+    generic = _bench("generic from_xml", lambda: [generic_from_xml(StaticObject, element) for element in objects])
+    _bench("compiled from_xml", lambda: [StaticObject.from_xml(element) for element in objects], generic)
+    _bench("from_elements (columns)", lambda: StaticObjectColumns.from_elements(StaticObject, objects), generic)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Places 100k empties with per-object mathutils matrices and with transforms.compose_euler_matrices.
+# Runs inside Blender: blender --background --factory-startup --python tests/bench_transforms_bpy.py
+import math
+import sys
+import time
+from pathlib import Path
+
+import bpy
+import numpy as np
+from mathutils import Euler, Matrix, Vector
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from transforms import compose_euler_matrices
+
+OBJECT_COUNT = 100_000
+
+
+def _new_empties(collection: bpy.types.Collection, count: int):
+    objects = []
+    for i in range(count):
+        obj = bpy.data.objects.new(f"bench_{i}", None)
+        collection.objects.link(obj)
+        objects.append(obj)
+    return objects
+
+
+def _remove(collection: bpy.types.Collection):
+    for obj in list(collection.objects):
+        bpy.data.objects.remove(obj)
+    bpy.data.collections.remove(collection)
+
+
+def main():
+    rng = np.random.default_rng(1234)
+    positions = rng.uniform(-100, 100, (OBJECT_COUNT, 3))
+    rotations = rng.uniform(-math.pi, math.pi, (OBJECT_COUNT, 3))
+    scales = rng.uniform(0.01, 5, (OBJECT_COUNT, 3))
+
+    collection = bpy.data.collections.new("transforms_bench")
+    bpy.context.scene.collection.children.link(collection)
+    objects = _new_empties(collection, OBJECT_COUNT)
+
+    start = time.perf_counter()
+    for obj, position, rotation, scale in zip(objects, positions.tolist(), rotations.tolist(), scales.tolist()):
+        obj.matrix_local = Matrix.LocRotScale(Vector(position), Euler(rotation, "XYZ"), Vector(scale))
+    per_object = time.perf_counter() - start
+    expected = np.array([obj.matrix_local for obj in objects[:1000]])
+
+    start = time.perf_counter()
+    matrices = compose_euler_matrices(positions, rotations, scales)
+    composed = time.perf_counter() - start
+    for obj, matrix in zip(objects, matrices):
+        obj.matrix_local = Matrix(matrix)
+    batched = time.perf_counter() - start
+    actual = np.array([obj.matrix_local for obj in objects[:1000]])
+
+    _remove(collection)
+    print(f"{OBJECT_COUNT} objects")
+    print(f"per-object mathutils        {per_object:.3f}s")
+    print(f"compose_euler_matrices      {batched:.3f}s ({composed:.3f}s composing), "
+          f"{per_object / batched:.1f}x")
+    print(f"max abs difference          {np.abs(actual - expected).max():.2e}")
+
+
+main()
@@ -0,0 +1,90 @@
+# Times parse_xml and iterparse with lxml against ElementTree on a generated HPL2 .map and HPL3 .hpm_StaticObject
+# of shipped-map size. Needs lxml importable: python tests/bench_xml_backend.py
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from resource_types import xml_backend
+
+STATIC_OBJECT_COUNT = 40_000
+ENTITY_COUNT = 5_000
+PLANE_COUNT = 5_000
+REPEATS = 3
+
+
+def _static_object(i: int, hpl3: bool):
+    extra = (f'UID="16 {i}" Active="true" CreStamp="1390000000" ModStamp="1390000100" IsOccluder="false" '
+             f'ColorMul="1 1 1 1" IllumColor="0 0 0 1" IllumBrightness="1" CulledByDistance="true" '
+             f'CulledByFog="true"' if hpl3 else 'Group="0" Tag=""')
+    return (f'<StaticObject ID="{i}" Name="static_{i}" FileIndex="{i % 200}" WorldPos="{i * 0.5} 1 {-i * 0.25}" '
+            f'Rotation="0 {i % 7 * 0.1} 0" Scale="1 1 1" Collides="true" CastShadows="true" {extra} />')
+
+
+def _write_map(path: Path):
+    with path.open("w", encoding="utf8") as f:
+        f.write('<Level><MapData Name=""><MapContents>')
+        f.write('<FileIndex_StaticObjects NumOfFiles="200">')
+        f.writelines(f'<File Id="{i}" Path="static_objects/set/object_{i}.dae" />' for i in range(200))
+        f.write('</FileIndex_StaticObjects><StaticObjects>')
+        f.writelines(_static_object(i, False) for i in range(STATIC_OBJECT_COUNT))
+        f.write('</StaticObjects><Primitives>')
+        f.writelines(f'<Plane ID="{i}" Name="Plane_{i}" Material="materials/floor.mat" StartCorner="0 0 0" '
+                     f'EndCorner="4 0 4" WorldPos="{i} 0 0" Rotation="0 0 0" Scale="1 1 1" TileAmount="1 1 1" '
+                     f'TileOffset="0 0 0" Corner1UV="0 0" Corner2UV="1 0" Corner3UV="0 1" Corner4UV="1 1" />'
+                     for i in range(PLANE_COUNT))
+        f.write('</Primitives><Entities>')
+        f.writelines(f'<Entity ID="{i}" Name="entity_{i}" FileIndex="0" WorldPos="{i} 0 1" Rotation="0 0 0" '
+                     f'Scale="1 1 1"><UserVariables><Var Name="Locked" Value="false" /></UserVariables></Entity>'
+                     for i in range(ENTITY_COUNT))
+        f.write('</Entities></MapContents></MapData></Level>')
+
+
+def _write_static_object_track(path: Path):
+    with path.open("w", encoding="utf8") as f:
+        f.write('<HPLMapTrack_StaticObject ID="0" MajorVersion="1" MinorVersion="1"><Section Name="user">')
+        f.write('<FileIndex_StaticObjects NumOfFiles="200">')
+        f.writelines(f'<File Id="{i}" Path="static_objects/set/object_{i}.ent" />' for i in range(200))
+        f.write('</FileIndex_StaticObjects><Objects>')
+        f.writelines(_static_object(i, True) for i in range(STATIC_OBJECT_COUNT))
+        f.write('</Objects></Section></HPLMapTrack_StaticObject>')
+
+
+def _drain_iterparse(path: Path):
+    for _, element in xml_backend.iterparse(path):
+        element.clear()
+
+
+def _best(fn, path: Path):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(path)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    if xml_backend._lxml is None:
+        raise SystemExit("lxml is not importable, nothing to compare against")
+    lxml = xml_backend._lxml
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [Path(tmp) / "bench.map", Path(tmp) / "bench.hpm_StaticObject"]
+        _write_map(files[0])
+        _write_static_object_track(files[1])
+        print(f"best of {REPEATS}, {STATIC_OBJECT_COUNT} static objects per file")
+        for path in files:
+            print(f"{path.name} ({path.stat().st_size / (1024 * 1024):.1f} MB)")
+            for label, fn in (("parse_xml", xml_backend.parse_xml), ("iterparse", _drain_iterparse)):
+                xml_backend._lxml = None
+                etree_time = _best(fn, path)
+                xml_backend._lxml = lxml
+                lxml_time = _best(fn, path)
+                print(f"\t{label:<10} ElementTree {etree_time:.3f}s, lxml {lxml_time:.3f}s, "
+                      f"{etree_time / lxml_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
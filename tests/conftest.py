@@ -0,0 +1,33 @@
+import dataclasses
+import datetime
+import sys
+from pathlib import Path
+
+import pytest
+
+# The addon is a UniLoader plugin package, resource_types only needs UniLoader itself and is imported top level
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _plain(value):
+    # Model trees as plain data; as_dict() where a model defines it, every parsed field otherwise
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (Path, datetime.datetime)):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if dataclasses.is_dataclass(value):
+        return {f.name: _plain(getattr(value, f.name)) for f in dataclasses.fields(value)}
+    if hasattr(value, "as_dict"):
+        return {"type": type(value).__name__, **_plain(value.as_dict())}
+    if hasattr(value, "__dict__"):
+        return {"type": type(value).__name__, **_plain(vars(value))}
+    return value
+
+
+@pytest.fixture
+def plain():
+    return _plain
@@ -0,0 +1,70 @@
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pytest
+
+pytest.importorskip("numpy")
+xml_parsing = pytest.importorskip("UniLoader.common_api.xml_parsing")
+
+from resource_types import compiled_xml
+from resource_types.hpl2 import map as hpl2_map
+from resource_types.hpl3 import map as hpl3_map
+from resource_types.hpl_common.ent import SubMesh
+from resource_types.hpl_common.map import File, StaticObjectColumns
+from resource_types.xml_backend import parse_xml
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# fixture file -> element tag -> model decoded from it on the hot map/ent paths
+HOT_MODELS = {
+    "sample.map": {"StaticObject": hpl2_map.StaticObject, "Plane": hpl2_map.Plane, "Decal": hpl2_map.Decal,
+                   "Entity": hpl2_map.Entity, "PointLight": hpl2_map.PointLight,
+                   "SpotLight": hpl2_map.SpotLight, "File": File},
+    "sample.hpm_StaticObject": {"StaticObject": hpl3_map.StaticObject, "File": File},
+    "sample.hpm_Entity": {"Entity": hpl3_map.Entity, "File": File},
+    "sample.hpm_Primitive": {"Plane": hpl3_map.Primitive},
+    "sample.ent": {"SubMesh": SubMesh, "PointLight": hpl2_map.PointLight},
+}
+
+
+def _hot_elements():
+    for file_name, models in HOT_MODELS.items():
+        root = parse_xml(FIXTURES / file_name)
+        for tag, model in models.items():
+            elements = list(root.iter(tag))
+            assert elements, f"{file_name} has no {tag}"
+            yield pytest.param(model, elements, id=f"{file_name}-{model.__module__.split('.')[-2]}.{model.__name__}")
+
+
+@pytest.mark.parametrize("model, elements", list(_hot_elements()))
+def test_compiled_decoder_matches_generic(plain, model, elements):
+    for element in elements:
+        compiled = model.from_xml(element)
+        assert compiled_xml._DECODERS[model] is not None
+        generic = xml_parsing.XmlAutoDeserialize.from_xml.__func__(model, element)
+        assert type(compiled) is type(generic)
+        assert plain(vars(compiled)) == plain(vars(generic))
+
+
+def test_unsupported_field_falls_back_to_generic():
+    class Multi(compiled_xml.CompiledXmlDeserialize):
+        items: list = xml_parsing.XChild.with_multiple_aliases("A", "B")
+
+    assert compiled_xml.compile_decoder(Multi) is None
+
+
+def test_static_object_columns_tolerate_malformed_rows():
+    elements = [
+        ElementTree.Element("StaticObject", ID="1", FileIndex="0", Name="a", WorldPos="1 2 3", Scale="2 2 2"),
+        ElementTree.Element("StaticObject", FileIndex="0", Name="no_id"),
+        ElementTree.Element("StaticObject", ID="3", Name="no_file_index"),
+        ElementTree.Element("StaticObject", ID="4", FileIndex="1", Name="b", WorldPos="4 5", Rotation="0 1 0 0"),
+        ElementTree.Element("StaticObject", ID="5", FileIndex="1", Name="c", WorldPos="7 8 9", Scale="1 x 1"),
+    ]
+    columns = StaticObjectColumns.from_elements(hpl3_map.StaticObject, elements)
+    assert columns.names == ["a", "b", "c"]
+    assert columns.ids.tolist() == [1, 4, 5]
+    assert columns.file_index.tolist() == [0, 1, 1]
+    assert columns.position.tolist() == [[1, 2, 3], [0, 0, 0], [7, 8, 9]]
+    assert columns.rotation.tolist() == [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    assert columns.scale.tolist() == [[2, 2, 2], [1, 1, 1], [1, 1, 1]]
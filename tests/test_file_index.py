@@ -0,0 +1,60 @@
+import importlib
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# common_utils uses relative imports, load it from a stand-in package so the addon __init__ (bpy) never runs
+_package = types.ModuleType("addon")
+_package.__path__ = [str(ROOT)]
+sys.modules.setdefault("addon", _package)
+common_utils = importlib.import_module("addon.common_utils")
+
+MASKS = ("*.ent", "*.msh")
+
+
+def _write_index(index_path: Path, game_root: Path, dirs):
+    index_path.write_text(json.dumps({"version": common_utils._INDEX_VERSION, "root": str(game_root.absolute()),
+                                      "masks": list(MASKS), "dirs": dirs}), encoding="utf8")
+
+
+def test_load_index_round_trip(tmp_path):
+    index_path = tmp_path / "index.json"
+    dirs = {"": {"mtime": 1, "files": ["a.ent"], "dirs": ["sub"]}, "sub": {"mtime": 2, "files": [], "dirs": []}}
+    _write_index(index_path, tmp_path, dirs)
+    assert common_utils._load_index(index_path, tmp_path, MASKS) == dirs
+
+
+@pytest.mark.parametrize("dirs", [
+    None,
+    [],
+    {"": None},
+    {"": {"mtime": 1, "files": ["a.ent"]}},
+    {"": {"mtime": "1", "files": [], "dirs": []}},
+    {"": {"mtime": 1, "files": "a.ent", "dirs": []}},
+    {"": {"mtime": 1, "files": [], "dirs": [1]}},
+])
+def test_load_index_rejects_corrupt_structure(tmp_path, dirs):
+    index_path = tmp_path / "index.json"
+    _write_index(index_path, tmp_path, dirs)
+    assert common_utils._load_index(index_path, tmp_path, MASKS) == {}
+
+
+def test_load_index_rejects_non_object(tmp_path):
+    index_path = tmp_path / "index.json"
+    index_path.write_text("[1, 2, 3]", encoding="utf8")
+    assert common_utils._load_index(index_path, tmp_path, MASKS) == {}
+
+
+def test_walk_rescans_after_corrupt_index(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.ent").write_text("", encoding="utf8")
+    index_path = tmp_path / "index.json"
+    _write_index(index_path, tmp_path, {"": {"mtime": 1, "files": None, "dirs": "sub"}})
+    stats = common_utils.walk_asset_tree(tmp_path, (".ent",), common_utils._load_index(index_path, tmp_path, MASKS))
+    assert stats.dirs["sub"]["files"] == ["a.ent"]
+    assert stats.rescanned == len(stats.dirs)
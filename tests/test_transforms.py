@@ -0,0 +1,125 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from transforms import euler_to_matrices, compose_euler_matrices, quaternion_to_matrices, \
+    compose_quaternion_matrices, compose_euler_matrix, matrices_to_euler, object_matrices
+
+RNG = np.random.default_rng(1234)
+
+
+def _axis_rotation(axis: int, angle: float):
+    c, s = math.cos(angle), math.sin(angle)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    matrix = np.eye(3)
+    matrix[i, i] = c
+    matrix[i, j] = -s
+    matrix[j, i] = s
+    matrix[j, j] = c
+    return matrix
+
+
+def _reference_euler(rotation):
+    # XYZ euler: X applied first, so R = Rz @ Ry @ Rx
+    x, y, z = rotation
+    return _axis_rotation(2, z) @ _axis_rotation(1, y) @ _axis_rotation(0, x)
+
+
+def _hamilton(a, b):
+    w1, x1, y1, z1 = a
+    w2, x2, y2, z2 = b
+    return np.array([w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2])
+
+
+def _reference_quaternion(quaternion):
+    # Columns are the basis vectors rotated by q v q*
+    q = np.asarray(quaternion, np.float64) / np.linalg.norm(quaternion)
+    conjugate = q * [1, -1, -1, -1]
+    return np.stack([_hamilton(_hamilton(q, np.r_[0, axis]), conjugate)[1:] for axis in np.eye(3)], axis=1)
+
+
+def _reference_compose(position, rotation_matrix, scale):
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation_matrix @ np.diag(scale)
+    matrix[:3, 3] = position
+    return matrix
+
+
+def test_euler_matches_axis_rotations():
+    rotations = RNG.uniform(-math.pi, math.pi, (64, 3))
+    expected = np.stack([_reference_euler(rotation) for rotation in rotations])
+    np.testing.assert_allclose(euler_to_matrices(rotations), expected, atol=1e-12)
+
+
+def test_quaternion_matches_hamilton_product():
+    quaternions = RNG.normal(size=(64, 4)) * RNG.uniform(0.5, 3, (64, 1))
+    expected = np.stack([_reference_quaternion(quaternion) for quaternion in quaternions])
+    np.testing.assert_allclose(quaternion_to_matrices(quaternions), expected, atol=1e-12)
+
+
+def test_compose_matches_loc_rot_scale():
+    positions = RNG.uniform(-100, 100, (32, 3))
+    rotations = RNG.uniform(-math.pi, math.pi, (32, 3))
+    scales = RNG.uniform(0.01, 5, (32, 3))
+    expected = np.stack([_reference_compose(p, _reference_euler(r), s)
+                         for p, r, s in zip(positions, rotations, scales)])
+    np.testing.assert_allclose(compose_euler_matrices(positions, rotations, scales), expected, atol=1e-9)
+
+    quaternions = RNG.normal(size=(32, 4))
+    radii = RNG.uniform(0.1, 2, 32)
+    expected = np.stack([_reference_compose(p, _reference_quaternion(q), [r, r, r])
+                         for p, q, r in zip(positions, quaternions, radii)])
+    np.testing.assert_allclose(compose_quaternion_matrices(positions, quaternions, radii), expected, atol=1e-9)
+
+
+def test_matrices_to_euler_round_trips():
+    rotations = RNG.uniform([-math.pi, -1.5, -math.pi], [math.pi, 1.5, math.pi], (64, 3))
+    np.testing.assert_allclose(matrices_to_euler(euler_to_matrices(rotations)), rotations, atol=1e-9)
+
+
+def test_object_matrices():
+    class Placement:
+        position = [1.0, 2.0, 3.0]
+        rotation = [0.1, 0.2, 0.3]
+        scale = [1.0, 2.0, 0.5]
+
+    expected = _reference_compose(Placement.position, _reference_euler(Placement.rotation), Placement.scale)
+    np.testing.assert_allclose(object_matrices([Placement]), [expected], atol=1e-12)
+    assert object_matrices([]).shape == (0, 4, 4)
+    np.testing.assert_allclose(compose_euler_matrix(Placement.position, Placement.rotation, Placement.scale),
+                               expected, atol=1e-12)
+
+
+def test_object_matrices_missing_fields():
+    # Area-style records can come without Scale (or any placement at all)
+    class Unscaled:
+        position = [1.0, 2.0, 3.0]
+        rotation = [0.1, 0.2, 0.3]
+        scale = None
+
+    class Unplaced:
+        position = rotation = scale = None
+
+    expected = _reference_compose(Unscaled.position, _reference_euler(Unscaled.rotation), [1.0, 1.0, 1.0])
+    np.testing.assert_allclose(object_matrices([Unscaled, Unplaced]), [expected, np.eye(4)], atol=1e-12)
+    np.testing.assert_allclose(compose_euler_matrix(Unscaled.position, Unscaled.rotation, None), expected, atol=1e-12)
+    np.testing.assert_allclose(compose_euler_matrix(None, None, None), np.eye(4), atol=1e-12)
+
+
+def test_matches_mathutils():
+    mathutils = pytest.importorskip("mathutils")
+    positions = RNG.uniform(-100, 100, (16, 3))
+    rotations = RNG.uniform(-math.pi, math.pi, (16, 3))
+    scales = RNG.uniform(0.01, 5, (16, 3))
+    quaternions = RNG.normal(size=(16, 4))
+    expected = [mathutils.Matrix.LocRotScale(mathutils.Vector(p), mathutils.Euler(r, "XYZ"), mathutils.Vector(s))
+                for p, r, s in zip(positions, rotations, scales)]
+    np.testing.assert_allclose(compose_euler_matrices(positions, rotations, scales),
+                               np.array(expected), atol=1e-4)
+    expected = [mathutils.Quaternion(q).normalized().to_matrix() for q in quaternions]
+    np.testing.assert_allclose(quaternion_to_matrices(quaternions), np.array(expected), atol=1e-5)
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("lxml")
+pytest.importorskip("UniLoader.common_api.xml_parsing")
+pytest.importorskip("numpy")
+
+from resource_types import xml_backend
+from resource_types.hpl2.ent import EntityFile
+from resource_types.hpl2.map import HPL2Map, MapContents, parse_map_record, MAP_RECORD_CONTAINERS
+from resource_types.hpl2.mat import Mat, Material
+from resource_types.hpl3.map import HPLMapTrackStaticObject, HPLMapTrackEntity, HPLMapTrackPrimitive, \
+    HPLMapTrackDetailMeshes
+from resource_types.hpl_common.stream import iter_map_records
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def _parse_with_both(monkeypatch, plain, path: Path, model, xpath: str = None):
+    def _parse():
+        root = xml_backend.parse_xml(path)
+        return plain(model.from_xml(root if xpath is None else root.find(xpath)))
+
+    assert xml_backend.XML_BACKEND == "lxml"
+    with_lxml = _parse()
+    monkeypatch.setattr(xml_backend, "_lxml", None)
+    return with_lxml, _parse()
+
+
+@pytest.mark.parametrize("file_name, model, xpath", [
+    ("sample.map", HPL2Map, None),
+    # Inner models as well, so the comparison can't pass on two empty wrapper objects
+    ("sample.map", MapContents, ".//MapContents"),
+    ("sample.hpm_StaticObject", HPLMapTrackStaticObject, None),
+    ("sample.hpm_Entity", HPLMapTrackEntity, None),
+    ("sample.hpm_Primitive", HPLMapTrackPrimitive, None),
+    ("sample.hpm_DetailMeshes", HPLMapTrackDetailMeshes, None),
+    ("sample.mat", Mat, None),
+    ("sample.mat", Material, "."),
+    ("sample.ent", EntityFile, None),
+])
+def test_models_match_between_backends(monkeypatch, plain, file_name, model, xpath):
+    with_lxml, with_expat = _parse_with_both(monkeypatch, plain, FIXTURES / file_name, model, xpath)
+    assert with_lxml == with_expat
+
+
+def test_inner_models_are_populated(monkeypatch, plain):
+    contents, _ = _parse_with_both(monkeypatch, plain, FIXTURES / "sample.map", MapContents, ".//MapContents")
+    assert len(contents["static_objects"]["names"]) == 2
+    assert len(contents["entities"]) == 4
+    material, _ = _parse_with_both(monkeypatch, plain, FIXTURES / "sample.mat", Material, ".")
+    assert sorted(material["textures"]) == ["Diffuse", "NMap"]
+
+
+def test_streamed_records_match_between_backends(monkeypatch, plain):
+    def _records():
+        return [(section.name, container, plain(record))
+                for section, container, record in iter_map_records(FIXTURES / "sample.map", parse_map_record,
+                                                                   MAP_RECORD_CONTAINERS)]
+
+    with_lxml = _records()
+    monkeypatch.setattr(xml_backend, "_lxml", None)
+    with_expat = _records()
+    assert len(with_lxml) == 8
+    assert with_lxml == with_expat
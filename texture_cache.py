@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .common_utils import get_cache_dir
+
+# DDS files Blender can't decode are transcoded to TGA once and kept in the user cache directory,
+# keyed by the hash of the DDS contents. Nothing is ever written next to the game files.
+
+_SUPPORTED_FOURCC = {b"DXT1", b"DXT3", b"DXT5"}
+_DDPF_FOURCC = 0x4
+_DDSD_PITCH = 0x8
+_DDSD_MIPMAPCOUNT = 0x20000
+_DDSD_LINEARSIZE = 0x80000
+_DDSCAPS2_CUBEMAP = 0x200
+_DDSCAPS2_VOLUME = 0x200000
+_FOURCC_BLOCK_BYTES = {b"DXT1": 8, b"DXT2": 16, b"DXT3": 16, b"DXT4": 16, b"DXT5": 16,
+                       b"ATI1": 8, b"BC4U": 8, b"BC4S": 8, b"ATI2": 16, b"BC5U": 16, b"BC5S": 16}
+# DXGI_FORMAT ranges of the DX10 extended header
+_DXGI_BLOCK_BYTES = {**dict.fromkeys(range(70, 73), 8), **dict.fromkeys(range(73, 79), 16),
+                     **dict.fromkeys(range(79, 82), 8), **dict.fromkeys(range(82, 85), 16),
+                     **dict.fromkeys(range(94, 100), 16)}
+_HASH_INDEX: dict[str, str] = {}
+_HASH_INDEX_LOADED = False
+_PREVIEW_LEVEL = 0
+# Set once worker processes failed to start, later imports transcode on threads right away
+_PROCESS_POOL_BROKEN = False
+
+
+def get_texture_cache_dir() -> Path:
+    cache_dir = get_cache_dir() / "textures"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def _hash_index_path():
+    return get_texture_cache_dir() / "index.json"
+
+
+def _load_hash_index():
+    global _HASH_INDEX_LOADED
+    if _HASH_INDEX_LOADED:
+        return
+    _HASH_INDEX_LOADED = True
+    try:
+        with _hash_index_path().open("r", encoding="utf8") as f:
+            _HASH_INDEX.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+
+def save_hash_index():
+    index_path = _hash_index_path()
+    tmp_path = index_path.with_suffix(".tmp")
+    try:
+        with tmp_path.open("w", encoding="utf8") as f:
+            json.dump(_HASH_INDEX, f)
+        os.replace(tmp_path, index_path)
+    except OSError as ex:
+        print(f"Failed to save texture cache index to {index_path}: {ex}")
+
+
+def content_hash(path: Path) -> str:
+    _load_hash_index()
+    stat = path.stat()
+    key = f"{str(path.absolute()).lower()}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = _HASH_INDEX.get(key)
+    if digest is None:
+        sha1 = hashlib.sha1()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(chunk)
+        digest = _HASH_INDEX[key] = sha1.hexdigest()
+    return digest
+
+
+def cached_tga_path(dds_path: Path) -> Path:
+    return get_texture_cache_dir() / f"{content_hash(dds_path)}.tga"
+
+
+def set_texture_preview_level(level: int):
+    # 0 loads full resolution, N skips the first N mip levels of every DDS texture
+    global _PREVIEW_LEVEL
+    _PREVIEW_LEVEL = max(0, level)
+
+
+def get_texture_preview_level():
+    return _PREVIEW_LEVEL
+
+
+def _dds_layout(header: bytes):
+    # (header size, mip level sizes) or None when the file can't be cut down to a mip level
+    if len(header) < 128 or header[:4] != b"DDS ":
+        return None
+    flags, height, width = struct.unpack_from("<3I", header, 8)
+    mip_count, = struct.unpack_from("<I", header, 28)
+    pf_flags, = struct.unpack_from("<I", header, 80)
+    fourcc = header[84:88]
+    bit_count, = struct.unpack_from("<I", header, 88)
+    caps2, = struct.unpack_from("<I", header, 112)
+    if not flags & _DDSD_MIPMAPCOUNT or mip_count <= 1 or caps2 & (_DDSCAPS2_CUBEMAP | _DDSCAPS2_VOLUME):
+        return None
+    header_size = 128
+    block_bytes = 0
+    if pf_flags & _DDPF_FOURCC:
+        if fourcc == b"DX10":
+            if len(header) < 148:
+                return None
+            dxgi_format, dimension, misc_flags, array_size = struct.unpack_from("<4I", header, 128)
+            if dimension != 3 or misc_flags & 0x4 or array_size > 1:
+                return None
+            header_size = 148
+            block_bytes = _DXGI_BLOCK_BYTES.get(dxgi_format, 0)
+        else:
+            block_bytes = _FOURCC_BLOCK_BYTES.get(fourcc, 0)
+        if not block_bytes:
+            return None
+    elif bit_count % 8:
+        return None
+    sizes = []
+    for level in range(mip_count):
+        mip_width = max(1, width >> level)
+        mip_height = max(1, height >> level)
+        if block_bytes:
+            sizes.append(((mip_width + 3) // 4) * ((mip_height + 3) // 4) * block_bytes)
+        else:
+            sizes.append(mip_width * mip_height * bit_count // 8)
+    return header_size, sizes
+
+
+def preview_dds(dds_path: Path, level: int) -> Path:
+    # Writes a DDS holding mip levels [level:] of dds_path into the cache, returns dds_path if it can't be reduced
+    try:
+        with dds_path.open("rb") as f:
+            header = f.read(148)
+    except OSError:
+        return dds_path
+    layout = _dds_layout(header)
+    if layout is None:
+        return dds_path
+    header_size, sizes = layout
+    level = min(level, len(sizes) - 1)
+    if level <= 0:
+        return dds_path
+    preview_dir = get_texture_cache_dir() / "preview"
+    preview_dir.mkdir(exist_ok=True)
+    preview_path = preview_dir / f"{content_hash(dds_path)}_{level}.dds"
+    if preview_path.exists():
+        return preview_path
+
+    new_header = bytearray(header[:header_size])
+    flags, height, width = struct.unpack_from("<3I", new_header, 8)
+    width = max(1, width >> level)
+    height = max(1, height >> level)
+    bit_count, = struct.unpack_from("<I", new_header, 88)
+    if flags & _DDSD_LINEARSIZE:
+        pitch = sizes[level]
+    elif flags & _DDSD_PITCH:
+        pitch = width * bit_count // 8
+    else:
+        pitch, = struct.unpack_from("<I", new_header, 20)
+    struct.pack_into("<4I", new_header, 8, flags, height, width, pitch)
+    struct.pack_into("<I", new_header, 28, len(sizes) - level)
+    with dds_path.open("rb") as f:
+        f.seek(header_size + sum(sizes[:level]))
+        data = f.read(sum(sizes[level:]))
+    if len(data) != sum(sizes[level:]):
+        return dds_path
+    tmp_path = preview_path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(new_header)
+        f.write(data)
+    os.replace(tmp_path, preview_path)
+    return preview_path
+
+
+def source_dds(dds_path: Path, level: Optional[int] = None) -> Path:
+    level = _PREVIEW_LEVEL if level is None else level
+    if level and dds_path.suffix.lower() == ".dds":
+        return preview_dds(dds_path, level)
+    return dds_path
+
+
+def needs_transcode(dds_path: Path) -> bool:
+    # Compressed formats other than DXT1/3/5 (ATI1/ATI2/DX10 ...) are not decoded by Blender
+    try:
+        with dds_path.open("rb") as f:
+            header = f.read(128)
+    except OSError:
+        return False
+    if len(header) < 128 or header[:4] != b"DDS ":
+        return False
+    flags, = struct.unpack_from("<I", header, 80)
+    return bool(flags & _DDPF_FOURCC) and header[84:88] not in _SUPPORTED_FOURCC
+
+
+def _transcode(dds_path: str, tga_path: str):
+    from ...common_api import Texture
+
+    texture = Texture.from_dds(Path(dds_path))
+    print(f"Found unsupported texture: {dds_path}: {texture.pixel_format.name}")
+    tmp_path = Path(tga_path).with_suffix(f".{os.getpid()}.tmp")
+    texture.write_tga(tmp_path)
+    os.replace(tmp_path, tga_path)
+    return tga_path
+
+
+def transcode_dds(dds_path: Path) -> Path:
+    tga_path = cached_tga_path(dds_path)
+    if not tga_path.exists():
+        _transcode(str(dds_path), str(tga_path))
+    return tga_path
+
+
+def _run_transcode_jobs(executor_type, jobs: dict[str, str], workers: Optional[int]):
+    with executor_type(workers) as pool:
+        futures = {tga_path: pool.submit(_transcode, dds_path, tga_path) for tga_path, dds_path in jobs.items()}
+        for tga_path, future in futures.items():
+            try:
+                future.result()
+            except (BrokenProcessPool, ImportError, pickle.PicklingError):
+                raise
+            except Exception as ex:
+                print(f"Failed to transcode {jobs[tga_path]}: {ex}")
+
+
+def prefill_texture_cache(dds_paths: Iterable[Path], workers: Optional[int] = None):
+    jobs = {}
+    for dds_path in dds_paths:
+        if dds_path.suffix.lower() != ".dds" or not needs_transcode(dds_path):
+            continue
+        dds_path = source_dds(dds_path)
+        tga_path = cached_tga_path(dds_path)
+        if not tga_path.exists():
+            jobs[str(tga_path)] = str(dds_path)
+    save_hash_index()
+    if not jobs:
+        return 0
+    global _PROCESS_POOL_BROKEN
+    print(f"Transcoding {len(jobs)} textures into {get_texture_cache_dir()}")
+    if _PROCESS_POOL_BROKEN:
+        _run_transcode_jobs(ThreadPoolExecutor, jobs, workers)
+        return len(jobs)
+    try:
+        _run_transcode_jobs(ProcessPoolExecutor, jobs, workers)
+    except (BrokenProcessPool, ImportError, OSError, pickle.PicklingError) as ex:
+        # Worker processes may be unable to import the addon (spawned outside of Blender), transcode on threads
+        print(f"Texture transcoding processes unavailable ({ex}), using threads from now on")
+        _PROCESS_POOL_BROKEN = True
+        remaining = {tga_path: dds_path for tga_path, dds_path in jobs.items() if not Path(tga_path).exists()}
+        _run_transcode_jobs(ThreadPoolExecutor, remaining, workers)
+    return len(jobs)
+
+
+def texture_source(dds_path: Path, level: Optional[int] = None) -> Path:
+    # The file load_texture will actually hand to Blender for a resolved texture
+    if dds_path.with_suffix(".tga").exists():
+        return dds_path.with_suffix(".tga")
+    if dds_path.suffix.lower() != ".dds":
+        return dds_path
+    source = source_dds(dds_path, level)
+    if needs_transcode(source):
+        tga_path = cached_tga_path(source)
+        if tga_path.exists():
+            return tga_path
+    return source
+
+
+@dataclass(slots=True)
+class TextureManifest:
+    # Unique resolved texture files of a map, keyed by lowercased resolved path
+    files: dict[str, Path] = field(default_factory=dict)
+
+    def add(self, resolved: Path):
+        self.files.setdefault(str(resolved).lower(), resolved)
+
+    def __len__(self):
+        return len(self.files)
+
+
+def _read_file(path: Path):
+    try:
+        with path.open("rb") as f:
+            return len(f.read())
+    except OSError:
+        return 0
+
+
+def prefetch_texture_bytes(manifest: TextureManifest, workers: Optional[int] = None):
+    # Pulls every texture through the OS file cache so the bpy.data.images.load calls that follow don't block on disk
+    with ThreadPoolExecutor(workers) as pool:
+        return sum(pool.map(_read_file, (texture_source(path) for path in manifest.files.values())))
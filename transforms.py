@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+
+_ORIGIN = (0.0, 0.0, 0.0)
+_UNIT_SCALE = (1.0, 1.0, 1.0)
+
+
+def euler_to_matrices(rotations: np.ndarray) -> np.ndarray:
+    # XYZ euler order, same as mathutils.Euler(rotation).to_matrix()
+    rotations = np.asarray(rotations, np.float64).reshape((-1, 3))
+    sx, sy, sz = np.sin(rotations).T
+    cx, cy, cz = np.cos(rotations).T
+    matrices = np.empty((len(rotations), 3, 3), np.float64)
+    matrices[:, 0, 0] = cz * cy
+    matrices[:, 0, 1] = cz * sy * sx - sz * cx
+    matrices[:, 0, 2] = cz * sy * cx + sz * sx
+    matrices[:, 1, 0] = sz * cy
+    matrices[:, 1, 1] = sz * sy * sx + cz * cx
+    matrices[:, 1, 2] = sz * sy * cx - cz * sx
+    matrices[:, 2, 0] = -sy
+    matrices[:, 2, 1] = cy * sx
+    matrices[:, 2, 2] = cy * cx
+    return matrices
+
+
+def compose_matrices(positions: np.ndarray, rotation_matrices: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    # Batched Matrix.LocRotScale: (N, 4, 4) row-major world matrices
+    positions = np.asarray(positions, np.float64).reshape((-1, 3))
+    scales = np.asarray(scales, np.float64).reshape((-1, 3))
+    matrices = np.zeros((len(positions), 4, 4), np.float64)
+    matrices[:, :3, :3] = rotation_matrices * scales[:, None, :]
+    matrices[:, :3, 3] = positions
+    matrices[:, 3, 3] = 1
+    return matrices
+
+
+def compose_euler_matrices(positions: np.ndarray, rotations: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return compose_matrices(positions, euler_to_matrices(rotations), scales)
+
+
+def quaternion_to_matrices(quaternions: np.ndarray) -> np.ndarray:
+    # (w, x, y, z) order, same as mathutils.Quaternion(rotation).to_matrix()
+    quaternions = np.asarray(quaternions, np.float64).reshape((-1, 4))
+    lengths = np.linalg.norm(quaternions, axis=1, keepdims=True)
+    w, x, y, z = (quaternions / np.where(lengths > 0, lengths, 1)).T
+    matrices = np.empty((len(quaternions), 3, 3), np.float64)
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - w * z)
+    matrices[:, 0, 2] = 2 * (x * z + w * y)
+    matrices[:, 1, 0] = 2 * (x * y + w * z)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - w * x)
+    matrices[:, 2, 0] = 2 * (x * z - w * y)
+    matrices[:, 2, 1] = 2 * (y * z + w * x)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+
+def compose_quaternion_matrices(positions: np.ndarray, quaternions: np.ndarray, radii: np.ndarray) -> np.ndarray:
+    radii = np.asarray(radii, np.float64).reshape((-1, 1))
+    return compose_matrices(positions, quaternion_to_matrices(quaternions), np.repeat(radii, 3, axis=1))
+
+
+def compose_euler_matrix(position, rotation, scale) -> np.ndarray:
+    # Single-object compose_euler_matrices without the batching overhead; missing fields are identity
+    px, py, pz = _ORIGIN if position is None else position
+    sx, sy, sz = _UNIT_SCALE if scale is None else scale
+    rx, ry, rz = _ORIGIN if rotation is None else rotation
+    snx, sny, snz = math.sin(rx), math.sin(ry), math.sin(rz)
+    csx, csy, csz = math.cos(rx), math.cos(ry), math.cos(rz)
+    return np.array([
+        [csz * csy * sx, (csz * sny * snx - snz * csx) * sy, (csz * sny * csx + snz * snx) * sz, px],
+        [snz * csy * sx, (snz * sny * snx + csz * csx) * sy, (snz * sny * csx - csz * snx) * sz, py],
+        [-sny * sx, csy * snx * sy, csy * csx * sz, pz],
+        [0.0, 0.0, 0.0, 1.0],
+    ], np.float64)
+
+
+def object_matrices(objects) -> np.ndarray:
+    # World matrices for a sequence of objects carrying position/rotation(euler)/scale lists,
+    # missing fields fall back to identity placement
+    if not objects:
+        return np.zeros((0, 4, 4), np.float64)
+    return compose_euler_matrices([_ORIGIN if obj.position is None else obj.position for obj in objects],
+                                  [_ORIGIN if obj.rotation is None else obj.rotation for obj in objects],
+                                  [_UNIT_SCALE if obj.scale is None else obj.scale for obj in objects])
+
+
+def matrices_to_euler(rotation_matrices: np.ndarray) -> np.ndarray:
+    # Inverse of euler_to_matrices, XYZ order
+    rotation_matrices = np.asarray(rotation_matrices, np.float64).reshape((-1, 3, 3))
+    eulers = np.empty((len(rotation_matrices), 3), np.float64)
+    eulers[:, 0] = np.arctan2(rotation_matrices[:, 2, 1], rotation_matrices[:, 2, 2])
+    eulers[:, 1] = np.arcsin(np.clip(-rotation_matrices[:, 2, 0], -1, 1))
+    eulers[:, 2] = np.arctan2(rotation_matrices[:, 1, 0], rotation_matrices[:, 0, 0])
+    return eulers